@@ -24,6 +24,7 @@ if __name__ == '__main__':
     import time
     # BEE2_config creates this config file to allow easy cross-module access
     from BEE2_config import GEN_OPTS
+    import BEE2_config
 
     from tk_root import TK_ROOT
     import UI
@@ -32,6 +33,7 @@ if __name__ == '__main__':
     import packageLoader
     import gameMan
     import extract_packages
+    import sound
     ERR_FORMAT = '''
     --------------
 
@@ -50,6 +52,12 @@ if __name__ == '__main__':
             'allow_any_folder_as_game': '0',
             'mute_sounds': '0',
             'show_wip_items': '0',
+            # Parse packages using multiple processes. Off by default, since
+            # starting the workers costs more than it saves on small installs.
+            'parallel_load': '0',
+            # How resources are copied into the game:
+            # auto, reflink, hardlink, symlink or copy.
+            'resource_deploy': 'auto',
         },
         'Debug': {
             # Show exceptions in dialog box when crash occurs
@@ -62,6 +70,10 @@ if __name__ == '__main__':
             'log_missing_ent_count': '0',
         },
     }
+    # Write changes to the config files in the background, so several
+    # changes are saved together.
+    BEE2_config.save_scheduler = TK_ROOT.after
+
     loadScreen.main_loader.set_length('UI', 9)
     loadScreen.main_loader.show()
 
@@ -92,6 +104,7 @@ if __name__ == '__main__':
                 'Debug', 'log_missing_styles'),
             log_missing_ent_count=GEN_OPTS.get_bool(
                 'Debug', 'log_missing_ent_count'),
+            parallel=GEN_OPTS.get_bool('General', 'parallel_load'),
         )
         UI.load_packages(pack_data)
         print('Done!')
@@ -112,10 +125,17 @@ if __name__ == '__main__':
 
         loadScreen.main_loader.destroy()
 
+        if sound.play_sound:
+            # Now the UI is shown, load the sounds in the background.
+            sound.load()
+
         if GEN_OPTS.get_bool('General', 'preserve_BEE2_resource_dir'):
             extract_packages.done_callback()
         else:
-            extract_packages.start_copying(pack_data['zips'])
+            extract_packages.start_copying(
+                pack_data['zips'],
+                pack_data['zip_index'],
+            )
 
         TK_ROOT.mainloop()
 
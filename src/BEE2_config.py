@@ -1,7 +1,18 @@
+import os
 import os.path
 
 from configparser import ConfigParser
 
+# Milliseconds to wait after a change before writing the file, so several
+# changes are written together.
+SAVE_DELAY = 2000
+
+# A function(delay, callback) which calls callback later on the main
+# thread - the app sets this to TK_ROOT.after. If it isn't set (in VBSP
+# and VRAD), changes are only written when save() or save_check() are
+# called.
+save_scheduler = None
+
 
 class ConfigFile(ConfigParser):
     def __init__(self, filename, root='../config', auto_load=True):
@@ -12,6 +23,7 @@ class ConfigFile(ConfigParser):
         """
         super().__init__()
         self.filename = os.path.join(root, filename)
+        self._save_pending = False
         self.has_changed = False
 
         if auto_load:
@@ -29,8 +41,37 @@ class ConfigFile(ConfigParser):
             # If we fail, just continue - we just use the default values
         self.has_changed = False
 
+    @property
+    def has_changed(self):
+        """If we have changes which haven't been written to disk.
+
+        Setting this schedules a save, if save_scheduler is set.
+        """
+        return self._has_changed
+
+    @has_changed.setter
+    def has_changed(self, value):
+        self._has_changed = value
+        if value and save_scheduler is not None and not self._save_pending:
+            self._save_pending = True
+            save_scheduler(SAVE_DELAY, self._delayed_save)
+
+    def _delayed_save(self):
+        """Write the changes made in the last SAVE_DELAY ms."""
+        self._save_pending = False
+        try:
+            self.save_check()
+        except OSError as e:
+            # Leave it marked as changed, so it's tried again at exit.
+            print('Could not save "{}": {!r}'.format(self.filename, e))
+            self._has_changed = True
+
     def save(self):
-        """Write our values out to disk."""
+        """Write our values out to disk.
+
+        The file is written to a temporary file first, so it isn't left
+        half-written if we crash.
+        """
         if self.filename is None:
             return
         self.has_changed = False
@@ -39,11 +80,16 @@ class ConfigFile(ConfigParser):
         if folder:
             os.makedirs(folder, exist_ok=True)
 
-        with open(self.filename, 'w') as conf:
+        with open(self.filename + '.tmp', 'w') as conf:
             self.write(conf)
+        os.replace(self.filename + '.tmp', self.filename)
 
     def save_check(self):
-        """Check to see if we have different values, and save if needed."""
+        """Check to see if we have different values, and save if needed.
+
+        With save_scheduler set this is done automatically, but call this
+        to make sure changes are written immediately.
+        """
         if self.has_changed:
             print('Saving changes in config "' + self.filename + '"!')
             self.save()
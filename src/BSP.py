@@ -1,10 +1,18 @@
 """Read and write lumps in Source BSP files.
 
 """
+import io
+import mmap
+import os
+import shutil
 import struct
 
+from collections import namedtuple
 from enum import Enum
 
+from property_parser import Property
+import vmfLib
+
 P2_BSP_VERSION = 21  # The BSP version used in Portal 2.
 BSP_MAGIC = b'VBSP'  # All BSP files start with this
 
@@ -107,6 +115,11 @@ class BSP_LUMPS(Enum):
 
 LUMP_COUNT = max(lump.value for lump in BSP_LUMPS) + 1  # 64 normally
 
+# The header for each sub-lump in the GAME_LUMP.
+# id is the 4-character name ('sprp' for static props), and
+# offset is relative to the start of the file.
+GameLump = namedtuple('GameLump', 'id, flags, version, offset, length')
+
 
 class BSP:
     """A BSP file."""
@@ -116,6 +129,31 @@ class BSP:
         self.lumps = {}
         self.header_off = 0
 
+        # The file is mapped into memory when lumps are first accessed.
+        self._mmap = None
+        self._view = None
+        # Lumps which have been decoded, and their values.
+        self._decoded = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """Release the memory-mapped file, and any decoded lumps.
+
+        Any memoryviews returned from lump_data() must be released first.
+        """
+        self._decoded.clear()
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
     def read_header(self):
         """Read through the BSP header to find the lumps.
 
@@ -138,33 +176,143 @@ class BSP:
 
     def get_lump(self, lump):
         """Read a lump from the BSP."""
+        return bytes(self.lump_data(lump))
+
+    def lump_data(self, lump) -> memoryview:
+        """Get a lump from the BSP, without copying it.
+
+        This is a slice of the memory-mapped file.
+        """
         if isinstance(lump, BSP_LUMPS):
             lump = self.lumps[lump]
-        with open(self.filename, 'rb') as file:
-            file.seek(lump.offset)
-            return file.read(lump.length)
+        if self._view is None:
+            with open(self.filename, 'rb') as file:
+                self._mmap = mmap.mmap(
+                    file.fileno(),
+                    0,
+                    access=mmap.ACCESS_READ,
+                )
+            self._view = memoryview(self._mmap)
+        return self._view[lump.offset:lump.offset + lump.length]
+
+    def _decode(self, lump, decoder):
+        """Decode a lump the first time it's requested."""
+        try:
+            return self._decoded[lump]
+        except KeyError:
+            with self.lump_data(lump) as data:
+                result = self._decoded[lump] = decoder(data)
+            return result
+
+    @property
+    def entities(self) -> vmfLib.VMF:
+        """The entities in the map, as a VMF.
+
+        worldspawn is the VMF's spawn entity.
+        """
+        return self._decode(BSP_LUMPS.ENTITIES, _decode_entities)
+
+    @property
+    def texdata_strings(self):
+        """The list of material names, indexed by the TexData string ID."""
+        table = self._decode(BSP_LUMPS.TEXDATA_STRING_TABLE, _decode_ints)
+        return self._decode(
+            BSP_LUMPS.TEXDATA_STRING_DATA,
+            lambda data: _decode_strings(data, table),
+        )
 
-    def replace_lump(self, new_name, lump, new_data: bytes):
-        """Write out the BSP file, replacing a lump with the given bytes.
+    @property
+    def game_lumps(self):
+        """A dict of the game lump headers, keyed by their 4-letter ID."""
+        return self._decode(BSP_LUMPS.GAME_LUMP, _decode_game_lumps)
 
+    def open_lump(self, lump):
+        """Open a lump as a read-only file, without reading it into memory.
+
+        This is useful for large lumps like the PAKFILE.
         """
         if isinstance(lump, BSP_LUMPS):
             lump = self.lumps[lump]
-        with open(self.filename, 'rb') as file:
-            data = file.read()
+        return io.BufferedReader(
+            LumpFile(open(self.filename, 'rb'), lump.offset, lump.length),
+        )
 
-        before_lump = data[self.header_off:lump.offset]
-        after_lump = data[lump.offset + lump.length:]
-        del data
+    def replace_lump_file(self, new_name, lump, new_file):
+        """Write out the BSP file, replacing a lump with a file's contents.
 
-        # Adjust the length to match the new data block.
-        lump.length = len(new_data)
+        Unlike replace_lump(), data is copied in chunks so the BSP never
+        needs to fit in memory. new_name may be the original file.
+        Lumps after this one are moved, along with the game lumps' data.
+        """
+        # The file is about to change.
+        self.close()
+        if isinstance(lump, BSP_LUMPS):
+            lump = self.lumps[lump]
 
-        with open(new_name, 'wb') as file:
-            self.write_header(file)
-            file.write(before_lump)
-            file.write(new_data)
-            file.write(after_lump)
+        new_file.seek(0, io.SEEK_END)
+        new_len = new_file.tell()
+        new_file.seek(0)
+
+        old_off = lump.offset
+        old_end = old_off + lump.length
+        # Lumps are 4-byte aligned, so the next lump may start after some
+        # padding. Keep everything from there.
+        following = [
+            other.offset
+            for other in self.lumps.values()
+            if other.offset >= old_end and other is not lump
+        ]
+        resume = min(following, default=old_end)
+        padding = -new_len % 4
+        shift = old_off + new_len + padding - resume
+
+        # Write to a temporary file, so we can replace the original.
+        temp_name = new_name + '.tmp'
+        with open(self.filename, 'rb') as file, open(temp_name, 'w+b') as out:
+            # Adjust the length to match the new data block, and shift
+            # any lumps which appear afterward.
+            lump.length = new_len
+            for other in self.lumps.values():
+                if other.offset >= resume and other is not lump:
+                    other.offset += shift
+            self.write_header(out)
+            file.seek(self.header_off)
+            _copy_bytes(file, out, old_off - self.header_off)
+            shutil.copyfileobj(new_file, out)
+            out.write(bytes(padding))
+            file.seek(resume)
+            shutil.copyfileobj(file, out)
+
+            if lump.type is not BSP_LUMPS.GAME_LUMP:
+                self._shift_game_lumps(out, resume, shift)
+        os.replace(temp_name, new_name)
+        self.filename = new_name
+
+    def _shift_game_lumps(self, file, start, shift):
+        """Fix the game lump headers in file after data was moved.
+
+        The game lumps store offsets from the start of the file, so any
+        starting after start need to move by shift bytes.
+        """
+        game_lump = self.lumps[BSP_LUMPS.GAME_LUMP]
+        if shift == 0 or game_lump.length < 4:
+            return
+        file.seek(game_lump.offset)
+        [count] = struct.unpack('<i', file.read(4))
+        for index in range(count):
+            # The offset follows the ID, flags and version.
+            pos = game_lump.offset + 4 + 16 * index + 8
+            file.seek(pos)
+            [offset] = struct.unpack('<i', file.read(4))
+            if offset >= start:
+                file.seek(pos)
+                file.write(struct.pack('<i', offset + shift))
+
+    def replace_lump(self, new_name, lump, new_data: bytes):
+        """Write out the BSP file, replacing a lump with the given bytes.
+
+        """
+        self.replace_lump_file(new_name, lump, io.BytesIO(new_data))
 
     def write_header(self, file):
         """Write the BSP file header into the given file."""
@@ -177,6 +325,146 @@ class BSP:
         # The map revision would follow, but we never change that value!
 
 
+def _decode_ints(data):
+    """Decode a lump which is an array of ints."""
+    return list(data.cast('i'))
+
+
+def _decode_strings(data, table):
+    """Decode the TEXDATA_STRING_DATA lump, using the offsets from the table.
+    """
+    data = bytes(data)
+    strings = []
+    for offset in table:
+        end = data.find(b'\0', offset)
+        if end == -1:
+            end = len(data)
+        strings.append(data[offset:end].decode('ascii', errors='replace'))
+    return strings
+
+
+def _decode_game_lumps(data):
+    """Decode the headers in the GAME_LUMP."""
+    if len(data) < 4:
+        return {}
+    [count] = struct.unpack_from('<i', data)
+    lumps = {}
+    for index in range(count):
+        lump_id, flags, version, offset, length = struct.unpack_from(
+            '<iHHii',
+            data,
+            4 + 16 * index,
+        )
+        # The ID is a 4-character code, stored as a little-endian int.
+        lump_id = struct.pack('>i', lump_id).decode('ascii', errors='replace')
+        lumps[lump_id] = GameLump(lump_id, flags, version, offset, length)
+    return lumps
+
+
+def _decode_entities(data) -> vmfLib.VMF:
+    """Parse the ENTITIES lump into a VMF.
+
+    The lump is a list of keyvalue blocks like a VMF's entities, except
+    they don't have names and outputs are inline keyvalues.
+    """
+    text = bytes(data).rstrip(b'\0').decode('ascii', errors='replace')
+    ent_props = []
+    cur_ent = None
+    for line in text.splitlines():
+        line = line.strip()
+        if line == '{':
+            cur_ent = Property('Entity', [])
+            outputs = Property('Connections', [])
+        elif line == '}':
+            if cur_ent is not None:
+                if outputs.value:
+                    cur_ent.value.append(outputs)
+                ent_props.append(cur_ent)
+            cur_ent = None
+        elif cur_ent is not None and line.startswith('"'):
+            # "key" "value"
+            parts = line.split('"')
+            if len(parts) < 4:
+                continue
+            key, value = parts[1], parts[3]
+            if _is_output(key, value):
+                outputs.value.append(Property(key, value))
+            else:
+                cur_ent.value.append(Property(key, value))
+
+    vmf = vmfLib.VMF()
+    for ent_prop in ent_props:
+        ent = vmfLib.Entity.parse(vmf, ent_prop)
+        if ent['classname'] == 'worldspawn':
+            vmf.spawn = ent
+        else:
+            vmf.add_ent(ent)
+    return vmf
+
+
+def _is_output(key, value):
+    """Check if an entity keyvalue is actually an output."""
+    if chr(27) in value:
+        return value.count(chr(27)) == 4
+    # Older compilers use commas.
+    return (
+        key.casefold().startswith(('on', 'out')) and
+        value.count(',') == 4
+    )
+
+
+def _copy_bytes(src, dest, length, chunk_size=64 * 1024):
+    """Copy length bytes from one file to another, in chunks."""
+    while length > 0:
+        data = src.read(min(length, chunk_size))
+        if not data:
+            break
+        dest.write(data)
+        length -= len(data)
+
+
+class LumpFile(io.RawIOBase):
+    """A read-only file restricted to a section of a BSP file."""
+    def __init__(self, file, offset, length):
+        super().__init__()
+        self._file = file
+        self._start = offset
+        self._length = length
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            pos += self._pos
+        elif whence == io.SEEK_END:
+            pos += self._length
+        self._pos = max(0, min(pos, self._length))
+        return self._pos
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self._length - self._pos)
+        if size <= 0:
+            return 0
+        self._file.seek(self._start + self._pos)
+        data = self._file.read(size)
+        buffer[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+        super().close()
+
+
 class Lump:
     """Represents a lump header in a BSP file.
 
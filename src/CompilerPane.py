@@ -155,7 +155,6 @@ def find_screenshot(_=None):
     )
     if file_name:
         load_screenshot(file_name)
-    COMPILE_CFG.save_check()
 
 
 def set_screen_type():
@@ -174,8 +173,6 @@ def set_screen_type():
         window.winfo_reqheight(),
     ))
 
-    COMPILE_CFG.save()
-
 
 def load_screenshot(path):
     """Copy the selected image, changing format if needed."""
@@ -219,14 +216,12 @@ def set_screenshot_cleanup():
 
 def set_elev_type():
     COMPILE_CFG['General']['spawn_elev'] = str(start_in_elev.get())
-    COMPILE_CFG.save()
 
 
 def set_model(_=None):
     """Save the selected player model."""
     text = player_model_var.get()
     COMPILE_CFG['General']['player_model'] = PLAYER_MODELS_REV[text]
-    COMPILE_CFG.save()
 
 
 def set_corr(corr_name, e):
@@ -235,7 +230,6 @@ def set_corr(corr_name, e):
     This is shared by all three dropdowns.
     """
     COMPILE_CFG['Corridor'][corr_name] = str(e.widget.current())
-    COMPILE_CFG.save()
 
 
 def set_corr_dropdown(corr_name, widget):
@@ -246,7 +240,6 @@ def set_corr_dropdown(corr_name, widget):
 def set_vrad_type():
     """Set the compile type override for VRAD."""
     COMPILE_CFG['General']['vrad_force_full'] = str(vrad_light_type.get())
-    COMPILE_CFG.save()
 
 
 def make_pane(tool_frame):
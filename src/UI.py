@@ -7,6 +7,7 @@ from functools import partial as func_partial
 import itertools
 import operator
 import random
+from collections import Counter
 
 from query_dialogs import ask_string
 from itemPropWin import PROP_TYPES
@@ -15,6 +16,7 @@ from BEE2_config import ConfigFile, GEN_OPTS
 import sound as snd
 from loadScreen import main_loader as loader
 import paletteLoader
+import packageLoader
 import img
 import utils
 
@@ -36,9 +38,20 @@ UI = {}
 menus = {}
 
 pal_picked = []  # array of the picker icons
-pal_items = []  # array of the "all items" icons
+# The number of each item on the palette, and the PalItem for each
+# subtype. Use pal_add_item() and PalItem.kill() to keep these in sync.
+pal_counts = Counter()
+pal_slots = {}
+pal_items = []  # array of the "all items" PickerItems
 pal_picked_fake = []  # Labels used for the empty palette positions
 pal_items_fake = []  # Labels for empty picker positions
+# PalItems reused to show the visible part of the picker.
+picker_labels = []
+# The layout set by flow_picker().
+picker_vis_items = []  # The PickerItems passing the filters
+picker_width = 1  # Items per row
+picker_offset = 0  # Space left for the filter popup
+picker_height = 1  # Total height of the scroll region
 
 
 FILTER_CATS = ('author', 'package', 'tags')
@@ -46,6 +59,8 @@ FilterBoxes = {}  # the various checkboxes for the filters
 FilterBoxes_all = {}
 FilterVars = {}  # The variables for the checkboxes
 FilterVars_all = {}
+# The bit used for each author, package and tag, set in load_packages().
+filter_bits = {cat: {} for cat in FILTER_CATS}
 
 ItemsBG = "#CDD0CE"  # Colour of the main background to match the menu image
 
@@ -89,6 +104,8 @@ class Item:
         'is_wip',
         'url',
         'can_group',
+        'filter_masks',
+        'meta',
         ]
 
     def __init__(self, item):
@@ -105,14 +122,7 @@ class Item:
         self.item = item
         self.def_data = self.item.def_ver['def_style']
         # These pieces of data are constant, only from the first style.
-        self.num_sub = sum(
-            1 for _ in
-            self.def_data['editor'].find_all(
-                "Editor",
-                "Subtype",
-                "Palette",
-                )
-            )
+        self.num_sub = len(self.def_data['meta'].sub_names)
         self.authors = self.def_data['auth']
         self.tags = self.def_data['tags']
 
@@ -130,11 +140,11 @@ class Item:
             selected_style,
             self.def_data,
             )
+        self.meta = self.data['meta']
         self.names = [
-            gameMan.translate(prop['name', ''])
-            for prop in
-            self.data['editor'].find_all("Editor", "Subtype")
-            if prop['Palette', None] is not None
+            gameMan.translate(name)
+            for name in
+            self.meta.sub_names
         ]
         self.is_dep = version['is_dep']
         self.is_wip = version['is_wip']
@@ -146,73 +156,72 @@ class Item:
                           self.data['all_name'] is not None and
                           self.data['all_icon'] is not None)
 
-    def get_icon(self, subKey, allow_single=False, single_num=1):
+    def get_icon(
+            self,
+            subKey,
+            allow_single=False,
+            single_num=1,
+            callback=None,
+            ):
         """Get an icon for the given subkey.
 
         If allow_single is true, the grouping icon can be returned
         instead if only one item is on the palette.
         Drag-icons have different rules for what counts as 'single', so
         they use the single_num parameter to control the output.
+        If callback is set, the icon is loaded in the background - see
+        img.icon_async().
         """
-        icons = self.data['icons']
-        num_picked = sum(
-            1 for item in
-            pal_picked if
-            item.id == self.id
-            )
-        if allow_single and self.can_group and num_picked <= single_num:
+        icon = self.get_icon_name(subKey, allow_single, single_num)
+        if callback is None:
+            return img.icon(icon)
+        else:
+            return img.icon_async(icon, callback)
+
+    def get_icon_name(self, subKey, allow_single=False, single_num=1):
+        """Get the filename of the icon get_icon() will use."""
+        if (
+                allow_single and self.can_group and
+                pal_counts[self.id] <= single_num
+                ):
             # If only 1 copy of this item is on the palette, use the
             # special icon
-            return img.icon(icons['all'])
+            return self.data['icons']['all']
         else:
-            return img.icon(icons[str(subKey)])
+            return self.data['icons'][str(subKey)]
 
     def properties(self):
         """Iterate through all properties for this item."""
-        for part in self.data['editor'].find_all("Properties"):
-            for prop in part:
-                yield prop.name
+        return iter(self.meta.properties)
 
     def get_properties(self):
         """Return a dictionary of properties and the current value for them.
 
         """
-        result = {}
-        for part in self.data['editor'].find_all("Properties"):
-            for prop in part:
-                name = prop.name
-                # PROP_TYPES is a dict holding all the modifiable properties.
-                if name not in result and name in PROP_TYPES:
-                    result[name] = item_opts.get_val(
-                        self.id,
-                        'PROP_' + name,
-                        prop["DefaultValue", ''],
-                        )
-        return result
+        return {
+            name: item_opts.get_val(self.id, 'PROP_' + name, default)
+            for name, default in
+            self.meta.prop_defaults.items()
+            # PROP_TYPES is a dict holding all the modifiable properties.
+            if name in PROP_TYPES
+        }
 
     def set_properties(self, props):
-        """Apply the properties to the item."""
+        """Save the properties for the item. These are applied on export."""
         for prop, value in props.items():
-            for def_prop in self.data['editor'].find_all(
-                    "Properties",
-                    prop,
-                    'DefaultValue',
-                    ):
-                def_prop.value = str(value)
             item_opts[self.id]['PROP_' + prop] = str(value)
 
     def refresh_subitems(self):
         """Call load_data() on all our subitems, so they reload icons and names.
 
         """
-        for refresh_cmd, subitem_list in [
-                (flow_preview, pal_picked),
-                (flow_picker, pal_items),
-                ]:
-            for item in subitem_list:
-                if item.id == self.id:
-                    item.load_data()
-            refresh_cmd()
+        for item in pal_slots.get(self.id, {}).values():
+            item.load_data()
+        flow_preview()
+        for item in picker_labels:
+            if item.id == self.id:
+                item.load_data()
+        flow_picker()
 
     def change_version(self, version):
         item_opts[self.id]['sel_version'] = version
@@ -247,17 +256,20 @@ class Item:
 
         # Build a dictionary of this item's palette positions,
         # if any exist.
-        palette_items = {
-            item.subKey: item
-            for item in pal_picked
-            if item.id == self.id
-        }
+        palette_items = pal_slots.get(self.id, {})
 
         new_editor = self.data['editor'].copy()
 
         new_editor['type'] = self.id # Set the item ID to match our item
         # This allows the folders to be reused for different items if needed.
 
+        props = self.get_properties()
+        for part in new_editor.find_all("Properties"):
+            for prop in part:
+                if prop.name in props:
+                    for def_prop in prop.find_all("DefaultValue"):
+                        def_prop.value = str(props[prop.name])
+
         for index, editor_section in enumerate(
                 new_editor.find_all("Editor", "Subtype")):
             # For each subtype, see if it's on the palette
@@ -289,6 +301,22 @@ class Item:
         )
 
 
+class PickerItem:
+    """A subitem in the item picker.
+
+    Only the items scrolled into view are shown, using a reusable PalItem.
+    """
+    __slots__ = ['item', 'subKey', 'id', 'visible', 'needs_unlock']
+
+    def __init__(self, item, sub):
+        self.item = item
+        self.subKey = sub
+        self.id = item.id
+        # Toggled according to filter settings
+        self.visible = True
+        self.needs_unlock = item.item.needs_unlock
+
+
 class PalItem(Label):
     """The icon and associated data for a single subitem."""
     def __init__(self, frame, item, sub, is_pre):
@@ -314,6 +342,20 @@ class PalItem(Label):
         self.bind("<Enter>", self.rollover)
         self.bind("<Leave>", self.rollout)
 
+    def rebind(self, item, sub):
+        """Show a different subitem, so picker labels can be reused."""
+        self.is_pre = False
+        if self.item is item and self.subKey == sub:
+            return
+        if contextWin.selected_sub_item is self:
+            # The context window would edit the new subitem instead.
+            contextWin.hide_context()
+        self.item = item
+        self.subKey = sub
+        self.id = item.id
+        self.needs_unlock = item.item.needs_unlock
+        self.load_data()
+
     def rollover(self, _):
         """Show the name of a subitem when moused over."""
         set_disp_name(self)
@@ -330,9 +372,13 @@ class PalItem(Label):
 
         This removes duplicates from the palette if needed.
         """
-        for item in pal_picked[:]:
-            if item.id == self.id and item.subKey == ind:
-                item.kill()
+        dupe = pal_slots.get(self.id, {}).get(ind)
+        if dupe is not None:
+            dupe.kill()
+        slots = pal_slots.get(self.id)
+        if slots is not None and slots.get(self.subKey) is self:
+            del slots[self.subKey]
+            slots[ind] = self
         self.subKey = ind
         self.load_data()
         self.master.update()  # Update the frame
@@ -343,11 +389,13 @@ class PalItem(Label):
 
         """
         if self.is_pre:
-            items_list = pal_picked[:]
+            items_list = list(pal_slots.get(self.id, {}).values())
         else:
             items_list = []
+            # Make sure the picker has a label for it.
+            show_picker_item(self.id, ind)
         # Open on the palette, but also open on the item picker if needed
-        for item in itertools.chain(items_list, pal_items):
+        for item in itertools.chain(items_list, picker_labels):
             if item.id == self.id and item.subKey == ind:
                 contextWin.show_prop(item, warp_cursor=True)
                 break
@@ -357,9 +405,23 @@ class PalItem(Label):
 
         Call whenever the style changes, so the icons update.
         """
-        self.img = self.item.get_icon(self.subKey, self.is_pre)
+        # A blank image is shown until the icon is loaded.
+        self.icon_request = request = object()
+        # flow_preview() checks this to see if the icon needs to change.
+        self.icon_name = self.item.get_icon_name(self.subKey, self.is_pre)
+
+        def set_icon(icon):
+            """Show the icon, unless it's been changed since."""
+            if self.icon_request is request and self.winfo_exists():
+                self.img = icon
+                self['image'] = icon
+
+        set_icon(self.item.get_icon(
+            self.subKey,
+            self.is_pre,
+            callback=set_icon,
+        ))
         self.name = gameMan.translate(self.item.names[self.subKey])
-        self['image'] = self.img
         # Put a large D over the item if it's deprecated.
         if self.item.is_dep:
             self['text'] = 'OLD'
@@ -373,28 +435,33 @@ class PalItem(Label):
 
         This prevents adding two copies.
         """
-        found = False
-        for item in pal_picked[:]:
-            # remove the item off of the palette if it's on there, this
-            # lets you delete items and prevents having the same item twice.
-            if self == item:
-                item.kill()
-                found = True
-        return found
+        # remove the item off of the palette if it's on there, this
+        # lets you delete items and prevents having the same item twice.
+        item = pal_slots.get(self.id, {}).get(self.subKey)
+        if item is None:
+            return False
+        item.kill()
+        return True
 
     def kill(self):
         """Hide and destroy this widget."""
-        if self in pal_picked:
-            pal_picked.remove(self)
+        for ind, item in enumerate(pal_picked):
+            if item is self:
+                del pal_picked[ind]
+                pal_counts[self.id] -= 1
+                slots = pal_slots[self.id]
+                if slots.get(self.subKey) is self:
+                    del slots[self.subKey]
+                if not pal_counts[self.id]:
+                    del pal_counts[self.id]
+                    del pal_slots[self.id]
+                break
         self.place_forget()
         self.destroy()
 
     def on_pal(self):
         """Determine if this item is on the palette."""
-        for item in pal_picked:
-            if self == item:
-                return True
-        return False
+        return self.subKey in pal_slots.get(self.id, ())
 
     def __eq__(self, other):
         """Two items are equal if they have the same item and sub-item index.
@@ -469,6 +536,21 @@ def load_packages(data):
             filter_data['package'][it.pak_id] = it.pak_name
         loader.step("IMG")
 
+    # Give each filter a bit, so update_filters() only needs to AND
+    # each item's masks with the selected ones.
+    for cat in FILTER_CATS:
+        filter_bits[cat] = {
+            filt_id: 1 << ind
+            for ind, filt_id in
+            enumerate(filter_data[cat])
+        }
+    for it in item_list.values():
+        it.filter_masks = (
+            filter_mask('author', [auth.casefold() for auth in it.authors]),
+            filter_mask('package', [it.pak_id]),
+            filter_mask('tags', [tag.casefold() for tag in it.tags]),
+        )
+
     StyleVarPane.add_vars(data['StyleVar'])
 
     for packlist in data['PackList']:
@@ -769,6 +851,8 @@ def export_editoritems(_=None):
             False,
         )
     )
+    # Don't keep the packages locked until the next export.
+    packageLoader.close_lazy_zips()
 
     messagebox.showinfo(
         'BEEMOD2',
@@ -788,6 +872,7 @@ def export_editoritems(_=None):
     # Save the configs since we're writing to disk anyway.
     GEN_OPTS.save_check()
     item_opts.save_check()
+    CompilerPane.COMPILE_CFG.save_check()
 
     # Since last_export is a zip, users won't be able to overwrite it
     # normally!
@@ -827,9 +912,8 @@ def drag_start(e):
         )
         drag_win.from_pal = True
 
-        for item in pal_picked:
-            if item.id == drag_win.drag_item.id:
-                item.load_data()
+        for item in pal_slots.get(drag_win.drag_item.id, {}).values():
+            item.load_data()
 
         # When dragging off, switch to the single-only icon
         UI['drag_lbl']['image'] = drag_win.drag_item.item.get_icon(
@@ -877,13 +961,10 @@ def drag_stop(e):
             drag_win.drag_item.clear()  # wipe duplicates off the palette first
             new_item = drag_win.drag_item.copy(frames['preview'])
             new_item.is_pre = True
-            if ind >= len(pal_picked):
-                pal_picked.append(new_item)
-            else:
-                pal_picked.insert(ind, new_item)
+            pal_add_item(new_item, ind)
             # delete the item - it's fallen off the palette
             if len(pal_picked) > 32:
-                pal_picked.pop().kill()
+                pal_picked[-1].kill()
         else:  # drop the item
             if drag_win.from_pal:
                 # Only remove if we started on the palette
@@ -906,14 +987,16 @@ def drag_move(e):
         if not drag_win.passed_over_pal:
             # If we've passed over the palette, replace identical items
             # with movement icons to indicate they will move to the new location
-            for item in pal_picked:
-                if item == drag_win.drag_item:
-                    # We haven't removed the original, so we don't need the
-                    # special label for this.
-                    # The group item refresh will return this if nothing
-                    # changes.
-                    item['image'] = img.png('BEE2/item_moving')
-                    break
+            item = pal_slots.get(drag_win.drag_item.id, {}).get(
+                drag_win.drag_item.subKey
+            )
+            if item is not None:
+                # We haven't removed the original, so we don't need the
+                # special label for this.
+                # The group item refresh will return this if nothing
+                # changes.
+                item['image'] = img.png('BEE2/item_moving')
+                item.icon_name = None
 
         drag_win.passed_over_pal = True
     else:
@@ -942,12 +1025,22 @@ def drag_fast(e):
             snd.fx('config')
             new_item = e.widget.copy(frames['preview'])
             new_item.is_pre = True
-            pal_picked.append(new_item)
+            pal_add_item(new_item)
         else:
             snd.fx('error')
     flow_preview()
 
 
+def pal_add_item(item, ind=None):
+    """Put a PalItem on the palette, at the given position or the end."""
+    if ind is None:
+        pal_picked.append(item)
+    else:
+        pal_picked.insert(ind, item)
+    pal_counts[item.id] += 1
+    pal_slots.setdefault(item.id, {})[item.subKey] = item
+
+
 def set_pal_radio():
     global selectedPalette
     selectedPalette = selectedPalette_radio.get()
@@ -973,7 +1066,7 @@ def set_palette(_=None):
         )
     for item, sub in palettes[selectedPalette].pos:
         if item in item_list.keys():
-            pal_picked.append(PalItem(
+            pal_add_item(PalItem(
                 frames['preview'],
                 item_list[item],
                 sub,
@@ -1010,7 +1103,7 @@ def pal_shuffle():
     random.shuffle(shuff_items)
 
     for item in shuff_items[:32-len(pal_picked)]:
-        pal_picked.append(PalItem(
+        pal_add_item(PalItem(
             frames['preview'],
             item,
             sub=0,  # Use the first subitem
@@ -1067,47 +1160,58 @@ def pal_remove():
             refresh_pal_ui()
 
 
+def filter_mask(cat, filters):
+    """Combine the bits for several authors, packages or tags."""
+    bits = filter_bits[cat]
+    mask = 0
+    for filt_id in filters:
+        mask |= bits[filt_id]
+    return mask
+
+
 def update_filters():
-    # First update the 'all' checkboxes to make half-selected if not
-    # fully selected.
+    # Read the checkboxes once, to find the selected filters in each
+    # category.
+    selected = {}
     for cat in FILTER_CATS:  # do for each
-        no_alt = True
-        all_vars = iter(FilterVars[cat].values())
-
-        # Pull the first one to get the compare value, this will check
-        # if they are all the same
-        value = next(all_vars).get()
-        for var in all_vars:
-            if var.get() != value:
-                # force it to be true so when clicked it'll blank out
-                # all the checkboxes
-                FilterVars_all[cat].set(True)
-                # make it the half-selected state, since they don't
-                # match
-                FilterBoxes_all[cat].state(['alternate'])
-                no_alt = False
-                break
-        if no_alt:  # no alternate if they are all the same
+        bits = filter_bits[cat]
+        mask = 0
+        for filt_id, var in FilterVars[cat].items():
+            if var.get():
+                mask |= bits[filt_id]
+        selected[cat] = mask
+
+        # Update the 'all' checkboxes to make half-selected if not
+        # fully selected.
+        if mask == 0 or mask == (1 << len(bits)) - 1:
+            # no alternate if they are all the same
             FilterBoxes_all[cat].state(['!alternate'])
-            FilterVars_all[cat].set(value)
+            FilterVars_all[cat].set(bool(mask))
+        else:
+            # force it to be true so when clicked it'll blank out
+            # all the checkboxes
+            FilterVars_all[cat].set(True)
+            # make it the half-selected state, since they don't
+            # match
+            FilterBoxes_all[cat].state(['alternate'])
+
     show_wip = optionWindow.SHOW_WIP.get()
     style_unlocked = StyleVarPane.tk_vars['UnlockDefault'].get() == 1
+    sel_auth = selected['author']
+    sel_pak = selected['package']
+    sel_tags = selected['tags']
     for item in pal_items:
-        item.visible = (
+        auth_mask, pak_mask, tag_mask = item.item.filter_masks
+        item.visible = bool(
             # Items are hidden if it's a wip item and the option is
             # deselected
             (show_wip or not item.item.is_wip)
             # Visible if any of the author and tag checkboxes are checked
-            and (any(
-                FilterVars['author'][auth.casefold()].get()
-                for auth in item.item.authors
-                ) or not item.item.authors) # Show if no authors
-            and (any(
-                FilterVars['tags'][tag.casefold()].get()
-                for tag in item.item.tags
-                ) or not item.item.tags) # Show if no tags
+            # Show if no authors or tags
+            and (auth_mask & sel_auth or not auth_mask)
+            and (tag_mask & sel_tags or not tag_mask)
             # The package is selected
-            and FilterVars['package'][item.item.pak_id].get()
+            and pak_mask & sel_pak
             # Items like the elevator that need the unlocked stylevar
             and (not item.needs_unlock or style_unlocked)
             )
@@ -1288,7 +1392,8 @@ def flow_preview():
         item.pre_y = i // 4
         item.place(x=(i % 4*65 + 4), y=(i // 4*65 + 32))
         # Check to see if this should use the single-icon
-        item.load_data()
+        if item.icon_name != item.item.get_icon_name(item.subKey, True):
+            item.load_data()
         item.lift()
 
     item_count = len(pal_picked)
@@ -1373,14 +1478,19 @@ def init_picker(f):
 
     scroll = ttk.Scrollbar(cframe, orient=VERTICAL, command=pal_canvas.yview)
     scroll.grid(column=1, row=0, sticky="NS")
-    pal_canvas['yscrollcommand'] = scroll.set
+
+    def picker_scrolled(first, last):
+        """Update the scrollbar, and show the items scrolled into view."""
+        scroll.set(first, last)
+        place_picker_labels()
+    pal_canvas['yscrollcommand'] = picker_scrolled
 
     # add another frame inside to place labels on
     frmScroll = ttk.Frame(pal_canvas)
     pal_canvas.create_window(1, 1, window=frmScroll, anchor="nw")
     for item in item_list.values():
         for i in range(0, item.num_sub):
-            pal_items.append(PalItem(frmScroll, item, sub=i, is_pre=False))
+            pal_items.append(PickerItem(item, i))
     f.bind("<Configure>", flow_picker)
 
 
@@ -1390,6 +1500,7 @@ def flow_picker(_=None):
     Should be run (e arg is ignored) whenever the items change, or the
     window changes shape.
     """
+    global picker_vis_items, picker_width, picker_offset, picker_height
     frmScroll.update_idletasks()
     frmScroll['width'] = pal_canvas.winfo_width()
     if frames['filter'].expanded:
@@ -1408,16 +1519,13 @@ def flow_picker(_=None):
         width = 1  # we got way too small, prevent division by zero
     vis_items = [it for it in pal_items if it.visible]
     num_items = len(vis_items)
-    for i, item in enumerate(vis_items):
-        item.is_pre = False
-        item.place(
-            x=((i % width) * 65 + 1),
-            y=((i // width) * 65 + offset + 1),
-            )
-
-    for item in (it for it in pal_items if not it.visible):
-        item.place_forget()
     height = (num_items//width + 1)*65 + offset + 2
+
+    picker_vis_items = vis_items
+    picker_width = width
+    picker_offset = offset
+    picker_height = height
+
     pal_canvas['scrollregion'] = (
         0,
         0,
@@ -1425,6 +1533,7 @@ def flow_picker(_=None):
         height,
         )
     frmScroll['height'] = height
+    place_picker_labels()
 
     # this adds extra blank items on the end to finish the grid nicely.
     blank_img = img.png('BEE2/blank')
@@ -1442,6 +1551,65 @@ def flow_picker(_=None):
         item.place_forget()
 
 
+def place_picker_labels():
+    """Position labels for the picker items which are scrolled into view.
+
+    Labels are reused, so only enough for the visible rows are created.
+    Item i is always shown by picker_labels[i % len(picker_labels)], so
+    scrolling by a row only changes one row of labels.
+    """
+    width = picker_width
+    view_top = pal_canvas.yview()[0] * picker_height - picker_offset
+    view_bottom = view_top + pal_canvas.winfo_height()
+    # Include an extra row on each side, so partial rows are shown.
+    first_row = max(int(view_top // 65) - 1, 0)
+    last_row = int(view_bottom // 65) + 1
+    first = first_row * width
+    last = min((last_row + 1) * width, len(picker_vis_items))
+
+    # Create enough labels for all the rows in view.
+    label_count = (last_row - first_row + 1) * width
+    while picker_vis_items and len(picker_labels) < label_count:
+        item = picker_vis_items[min(first, len(picker_vis_items) - 1)]
+        label = PalItem(frmScroll, item.item, item.subKey, is_pre=False)
+        label.visible = False
+        picker_labels.append(label)
+
+    used = set()
+    for i in range(first, last):
+        item = picker_vis_items[i]
+        label_ind = i % len(picker_labels)
+        used.add(label_ind)
+        label = picker_labels[label_ind]
+        label.rebind(item.item, item.subKey)
+        label.visible = True
+        label.place(
+            x=((i % width) * 65 + 1),
+            y=((i // width) * 65 + picker_offset + 1),
+            )
+
+    for label_ind, label in enumerate(picker_labels):
+        if label.visible and label_ind not in used:
+            label.visible = False
+            label.place_forget()
+            if contextWin.selected_sub_item is label:
+                contextWin.hide_context()
+
+
+def show_picker_item(item_id, sub_key):
+    """Scroll the picker so a subitem has a label, if it isn't filtered."""
+    for label in picker_labels:
+        if label.visible and label.id == item_id and label.subKey == sub_key:
+            return
+    for i, item in enumerate(picker_vis_items):
+        if item.id == item_id and item.subKey == sub_key:
+            pal_canvas.yview_moveto(
+                ((i // picker_width) * 65 + picker_offset) / picker_height
+            )
+            place_picker_labels()
+            return
+
+
 def init_filter_col(cat, f):
     FilterBoxes[cat] = {}
     FilterVars[cat] = {}
@@ -1919,7 +2087,11 @@ def init_windows():
 
         style_obj = styles[selected_style]
 
-        for item in itertools.chain(item_list.values(), pal_picked, pal_items):
+        for item in itertools.chain(
+                item_list.values(),
+                pal_picked,
+                picker_labels,
+                ):
             item.load_data()  # Refresh everything
 
         # Disable this if the style doesn't have elevators
@@ -1957,3 +2129,4 @@ def init_windows():
     style_win.callback = style_select_callback
     style_select_callback(style_win.chosen_id)
     set_palette()
+    img.print_stats()
@@ -0,0 +1,326 @@
+"""Inspect and clean up the PAKFILE lump of a BSP file.
+
+Run with a BSP to list the packed files, along with any duplicates and
+files the map doesn't seem to use. With --strip, those are removed and
+the pakfile is rewritten.
+Everything is read in chunks, so large BSPs don't need to fit in memory.
+"""
+import argparse
+import hashlib
+import re
+import shutil
+import struct
+import sys
+import tempfile
+from collections import defaultdict
+from zipfile import ZipFile, ZipInfo, ZIP_STORED, ZIP_DEFLATED, ZIP_LZMA
+
+from BSP import BSP, BSP_LUMPS
+
+COMPRESSION_TYPES = {
+    # Portal 2 only reads uncompressed pakfiles, so that's the default.
+    'stored': ZIP_STORED,
+    'deflate': ZIP_DEFLATED,
+    'lzma': ZIP_LZMA,
+}
+
+# Quoted strings in the entity lump.
+ENT_VALUE = re.compile(rb'"([^"]*)"')
+# Tokens in a VMT, which may be textures or other materials.
+VMT_TOKEN = re.compile(rb'"([^"]+)"|([^\s"{}]+)')
+# Printable strings inside binary files (models).
+BIN_STRING = re.compile(rb'[\x20-\x7e]{3,}')
+# Filenames inside other packed files (particles, scripts, soundscripts).
+PATH_TOKEN = re.compile(rb'[\w./\\-]{3,}')
+# Packed files which can't refer to other files, so aren't searched.
+UNSCANNED_EXTS = ('.wav', '.mp3', '.ogg', '.vtf', '.jpg', '.png', '.bik')
+# The six faces of the skybox set in worldspawn.
+SKYBOX_SIDES = ('up', 'dn', 'lf', 'rt', 'ft', 'bk')
+
+CHUNK_SIZE = 64 * 1024
+# The compression level used for deflate.
+COMPRESS_LEVEL = 9
+
+
+def norm_path(path):
+    """Normalise a filename for comparisons."""
+    if isinstance(path, bytes):
+        path = path.decode('ascii', errors='replace')
+    return path.replace('\\', '/').strip('/').casefold()
+
+
+def read_static_props(bsp: BSP):
+    """Read the model names from the static prop game lump."""
+    lump = bsp.game_lumps.get('sprp')
+    if lump is None or lump.length < 4:
+        return []
+    # Game lump offsets are relative to the start of the file.
+    with open(bsp.filename, 'rb') as file:
+        file.seek(lump.offset)
+        [dict_count] = struct.unpack('<i', file.read(4))
+        return [
+            file.read(128).rstrip(b'\0')
+            for _ in range(dict_count)
+        ]
+
+
+def add_reference(name, materials, models):
+    """Record a filename found in the map or in a packed file."""
+    if name.endswith('.mdl'):
+        models.add(name[:-4])
+        return
+    if name.startswith('materials/'):
+        name = name[10:]
+    if name.endswith(('.vmt', '.vtf', '.spr')):
+        materials.add(name[:-4])
+    else:
+        # Could be a material ('material' on overlays, etc)
+        materials.add(name)
+
+
+def find_references(bsp: BSP, pak: ZipFile):
+    """Find all the files in the pakfile the map refers to.
+
+    Textures used by brushes, and models/materials named in the entities
+    and static props are included, as well as anything a used VMT or
+    model refers to. Files which are always kept (particles, scripts,
+    soundscripts...) are searched for filenames too.
+    Returns a set of normalised names (without extensions for models).
+    """
+    materials = set()
+    models = set()
+
+    for name in bsp.texdata_strings:
+        materials.add(norm_path(name))
+
+    for value in ENT_VALUE.findall(bsp.get_lump(BSP_LUMPS.ENTITIES)):
+        add_reference(norm_path(value), materials, models)
+
+    skyname = norm_path(bsp.entities.spawn['skyname', ''])
+    if skyname:
+        for side in SKYBOX_SIDES:
+            materials.add('skybox/' + skyname + side)
+
+    for name in read_static_props(bsp):
+        name = norm_path(name)
+        if name.endswith('.mdl'):
+            models.add(name[:-4])
+
+    packed = {norm_path(info.filename): info for info in pak.infolist()}
+
+    for name, info in packed.items():
+        if name.startswith('materials/maps/') and name.endswith('.vmt'):
+            # Always kept, so check what they use.
+            materials.add(name[10:-4])
+        elif (
+                not name.startswith(('materials/', 'models/')) and
+                not name.endswith(UNSCANNED_EXTS)
+                ):
+            for token in PATH_TOKEN.findall(pak.read(info)):
+                add_reference(norm_path(token), materials, models)
+
+    # Models name their materials as a list of folders and texture names,
+    # look for all the combinations.
+    for model in models:
+        info = packed.get(model + '.mdl')
+        if info is None:
+            continue
+        strings = [
+            norm_path(string)
+            for string in
+            BIN_STRING.findall(pak.read(info))
+        ]
+        folders = [string for string in strings if string] + ['']
+        for folder in folders:
+            for tex in strings:
+                materials.add(folder + '/' + tex if folder else tex)
+
+    # VMTs can refer to textures, or other materials. Keep going until
+    # we've found all of them.
+    todo = list(materials)
+    while todo:
+        info = packed.get('materials/' + todo.pop() + '.vmt')
+        if info is None:
+            continue
+        for quoted, plain in VMT_TOKEN.findall(pak.read(info)):
+            name = norm_path(quoted or plain)
+            if name.endswith(('.vtf', '.vmt')):
+                name = name[:-4]
+            if name not in materials:
+                materials.add(name)
+                todo.append(name)
+
+    refs = {
+        'materials/' + mat + ext
+        for mat in materials
+        for ext in ('.vmt', '.vtf')
+    }
+    refs.update(models)
+    return refs
+
+
+def is_referenced(name, refs):
+    """Check if a packed file is used, given the result of find_references.
+
+    Only materials and models can be checked - anything else is assumed
+    to be used. The compiler's cubemaps and patched materials in
+    materials/maps/ are loaded by the engine directly, so they're kept.
+    """
+    if name.startswith('materials/maps/'):
+        return True
+    elif name.startswith('materials/'):
+        if name.endswith('.hdr.vtf'):
+            # HDR versions of a texture are used along with it.
+            name = name[:-8] + '.vtf'
+        return name in refs
+    elif name.startswith('models/'):
+        # Models have several files (.mdl, .vvd, .dx90.vtx, .phy..)
+        return name.split('.', 1)[0] in refs
+    return True
+
+
+def hash_entry(pak: ZipFile, info: ZipInfo):
+    """Hash the contents of a zip member."""
+    sha = hashlib.sha1()
+    with pak.open(info) as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+            sha.update(chunk)
+    return sha.digest()
+
+
+def inspect(bsp: BSP, pak: ZipFile, show_entries=True):
+    """Print out the files in the pakfile, and locate unneeded ones.
+
+    Returns a set of the ZipInfos which can be removed.
+    """
+    by_hash = defaultdict(list)
+    by_name = {}
+    removable = set()
+
+    if show_entries:
+        print('{:>10} {:>10} {:>6}  {}'.format(
+            'Size', 'Packed', 'Ratio', 'Filename',
+        ))
+    total_size = total_packed = 0
+    for info in pak.infolist():
+        total_size += info.file_size
+        total_packed += info.compress_size
+        if show_entries:
+            print('{:>10} {:>10} {:>6.1%}  {}'.format(
+                info.file_size,
+                info.compress_size,
+                info.compress_size / info.file_size if info.file_size else 1,
+                info.filename,
+            ))
+        name = norm_path(info.filename)
+        if name in by_name:
+            # Repeated filenames - only the last one can be read.
+            removable.add(by_name[name])
+        by_name[name] = info
+        by_hash[hash_entry(pak, info)].append(info)
+
+    print('{} files, {} bytes ({} packed)'.format(
+        len(pak.infolist()),
+        total_size,
+        total_packed,
+    ))
+
+    dupes = [infos for infos in by_hash.values() if len(infos) > 1]
+    if dupes:
+        print('\nByte-identical files:')
+        for infos in dupes:
+            print(' - ' + ', '.join(info.filename for info in infos))
+
+    refs = find_references(bsp, pak)
+    unused = [
+        info for name, info in sorted(by_name.items())
+        if not is_referenced(name, refs)
+    ]
+    if unused:
+        print('\nUnreferenced files:')
+        for info in unused:
+            print(' - ' + info.filename)
+    removable.update(unused)
+
+    print('\n{} removable files, {} bytes.'.format(
+        len(removable),
+        sum(info.compress_size for info in removable),
+    ))
+    return removable
+
+
+def write_pakfile(pak: ZipFile, dest_file, skip, compression):
+    """Write the files in pak to dest_file, except for those in skip."""
+    with ZipFile(dest_file, 'w', compression) as new_pak:
+        for info in pak.infolist():
+            if info in skip:
+                continue
+            new_info = ZipInfo(info.filename, info.date_time)
+            new_info.compress_type = compression
+            # ZipFile only applies its compresslevel to entries it
+            # creates itself, so set it on ours directly.
+            new_info._compresslevel = COMPRESS_LEVEL
+            new_info.file_size = info.file_size
+            new_info.external_attr = info.external_attr
+            new_info.comment = info.comment
+            with pak.open(info) as src, new_pak.open(new_info, 'w') as dest:
+                shutil.copyfileobj(src, dest, CHUNK_SIZE)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description='List and clean up the files packed into a BSP.',
+    )
+    parser.add_argument('bsp', help='The BSP file to read.')
+    parser.add_argument(
+        '--quiet', '-q',
+        action='store_true',
+        help="Don't list every packed file.",
+    )
+    parser.add_argument(
+        '--strip',
+        action='store_true',
+        help='Rewrite the pakfile without duplicate or unused files.',
+    )
+    parser.add_argument(
+        '--output', '-o',
+        help='Write the modified BSP here, instead of overwriting it.',
+    )
+    parser.add_argument(
+        '--compression',
+        choices=sorted(COMPRESSION_TYPES),
+        default='stored',
+        help='Compression to use when rewriting the pakfile.',
+    )
+    args = parser.parse_args(argv)
+
+    bsp = BSP(args.bsp)
+    bsp.read_header()
+
+    with bsp.open_lump(BSP_LUMPS.PAKFILE) as lump_file:
+        with ZipFile(lump_file) as pak:
+            removable = inspect(bsp, pak, show_entries=not args.quiet)
+
+            if not args.strip:
+                return
+
+            new_lump = tempfile.TemporaryFile()
+            write_pakfile(
+                pak,
+                new_lump,
+                removable,
+                COMPRESSION_TYPES[args.compression],
+            )
+
+    # The BSP needs to be closed before we can overwrite it.
+    with new_lump:
+        bsp.replace_lump_file(
+            args.output or args.bsp,
+            BSP_LUMPS.PAKFILE,
+            new_lump,
+        )
+    print('Pakfile rewritten!')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -250,43 +250,17 @@ def load_item_data():
         wid['moreinfo'].state(['!disabled'])
     wid['moreinfo'].tooltip_text = selected_item.url
 
-    editor_data = item_data['editor']
-    has_inputs = False
-    has_polarity = False
-    has_outputs = False
-    for inp_list in editor_data.find_all("Exporting", "Inputs"):
-        for inp in inp_list:
-            if inp.name == "CONNECTION_STANDARD":
-                has_inputs = True
-            elif inp.name == "CONNECTION_TBEAM_POLARITY":
-                has_polarity = True
-    for out_list in editor_data.find_all("Exporting", "Outputs"):
-        for out in out_list:
-            if out.name == "CONNECTION_STANDARD":
-                has_outputs = True
-                break
-    has_timer = any(editor_data.find_all("Properties", "TimerDelay"))
-
-    editor_bit = next(editor_data.find_all("Editor"))
-    rot_type = editor_bit["MovementHandle", "HANDLE_NONE"].casefold()
-
-    facing_type = editor_bit["InvalidSurface", ""].casefold()
-    surf_wall = "wall" in facing_type
-    surf_floor = "floor" in facing_type
-    surf_ceil = "ceiling" in facing_type
-
-    is_embed = any(editor_data.find_all("Exporting", "EmbeddedVoxels"))
-
-    if has_inputs:
-        if has_polarity:
+    meta = selected_item.meta
+    if meta.has_inputs:
+        if meta.has_polarity:
             wid['sprite'][0]['image'] = png.spr('in_polarity')
         else:
             wid['sprite'][0]['image'] = png.spr('in_norm')
     else:
         wid['sprite'][0]['image'] = png.spr('in_none')
 
-    if has_outputs:
-        if has_timer:
+    if meta.has_outputs:
+        if meta.has_timer:
             wid['sprite'][1]['image'] = png.spr('out_tim')
         else:
             wid['sprite'][1]['image'] = png.spr('out_norm')
@@ -295,22 +269,22 @@ def load_item_data():
 
     wid['sprite'][2]['image'] = png.spr(
         ROT_TYPES.get(
-            rot_type.casefold(),
+            meta.rot_type,
             'rot_none',
         )
     )
 
-    if is_embed:
+    if meta.is_embed:
         wid['sprite'][3]['image'] = png.spr('space_embed')
     else:
         wid['sprite'][3]['image'] = png.spr('space_none')
 
     face_spr = "surf"
-    if not surf_wall:
+    if not meta.surf_wall:
         face_spr += "_wall"
-    if not surf_floor:
+    if not meta.surf_floor:
         face_spr += "_floor"
-    if not surf_ceil:
+    if not meta.surf_ceil:
         face_spr += "_ceil"
     if face_spr == "surf":
         face_spr += "_none"
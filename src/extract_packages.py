@@ -1,20 +1,29 @@
 # coding=utf-8
 """
-Handles extracting all the package resources in a background process, so users
+Handles extracting all the package resources in background processes, so users
 can do other things without waiting.
 """
 import tkinter as tk
 
 import multiprocessing
+import threading
 import shutil
+import json
 import os.path
-from zipfile import ZipFile
+from collections import defaultdict
 
-from FakeZip import zip_names, FakeZip
+import packageWorker
 from tk_root import TK_ROOT
 
 UPDATE_INTERVAL = 500  # Number of miliseconds between each progress check
 
+# Large packages are split into jobs of this many files, so the work is
+# spread evenly between the worker processes.
+JOB_SIZE = 500
+
+# Records the package file each extracted resource came from.
+MANIFEST_FILE = os.path.join('..', 'cache', 'resources_manifest.json')
+
 files_done = False
 res_count = -1
 progress_var = tk.IntVar()
@@ -28,36 +37,174 @@ def done_callback():
     pass
 
 
-def do_copy(zip_list, done_files):
-    cache_path = os.path.abspath('../cache/')
-    shutil.rmtree(cache_path, ignore_errors=True)
+def load_manifest(filename):
+    """Read a manifest of copied resources.
+
+    This maps the casefolded path of each resource to a
+    [package, member, size, crc] list. None is returned if the manifest
+    is missing or unreadable.
+    """
+    try:
+        with open(filename) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print('Invalid manifest "{}": {!r}'.format(filename, e))
+        return None
+
+
+def save_manifest(filename, manifest):
+    """Write a manifest of copied resources."""
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename + '.tmp', 'w') as file:
+        json.dump(manifest, file)
+    os.replace(filename + '.tmp', filename)
+
+
+def build_manifest(zip_list, zip_index):
+    """Find the package each resource will be taken from.
 
-    img_loc = os.path.join('resources', 'bee2')
+    Packages later in the list override earlier ones.
+    """
+    manifest = {}
     for zip_path in zip_list:
-        if os.path.isfile(zip_path):
-            zip_file = ZipFile(zip_path)
+        for path, pak_file in zip_index[zip_path].items():
+            if pak_file.is_resource and not pak_file.is_image:
+                manifest[path] = [
+                    zip_path,
+                    pak_file.member,
+                    pak_file.size,
+                    pak_file.crc,
+                ]
+    return manifest
+
+
+def do_copy(zip_list, zip_index, done_files):
+    """Extract the resources from each package.
+
+    zip_index maps each package path to its index from
+    packageWorker.index_package(). Only files which changed since the
+    last extraction are copied, by comparing the size and CRC in the
+    package index with the manifest.
+    """
+    global res_count
+    cache_path = os.path.abspath('../cache/')
+
+    old_manifest = load_manifest(MANIFEST_FILE)
+    if old_manifest is None:
+        # We don't know what's there, so start over.
+        # Leave the package cache alone.
+        shutil.rmtree(
+            os.path.join(cache_path, 'resources'),
+            ignore_errors=True,
+        )
+        old_manifest = {}
+    else:
+        # If we're interrupted the files won't match, so remove it
+        # until we're done.
+        os.remove(MANIFEST_FILE)
+
+    manifest = build_manifest(zip_list, zip_index)
+
+    # Remove files which aren't in any package anymore.
+    for path, (zip_path, member, size, crc) in old_manifest.items():
+        new_entry = manifest.get(path)
+        if new_entry is None or new_entry[1] != member:
+            try:
+                os.remove(os.path.join(cache_path, member))
+            except FileNotFoundError:
+                pass
+
+    unchanged = 0
+    to_extract = defaultdict(list)
+    for path, entry in manifest.items():
+        if old_manifest.get(path) == entry and os.path.isfile(
+                os.path.join(cache_path, entry[1])
+                ):
+            unchanged += 1
         else:
-            zip_file = FakeZip(zip_path)
-        with zip_file:
-            for path in zip_names(zip_file):
-                loc = os.path.normcase(path)
-                if loc.startswith("resources"):
-                    # Don't re-extract images
-                    if not loc.startswith(img_loc):
-                        zip_file.extract(path, path=cache_path)
-                    with currently_done.get_lock():
-                        done_files.value += 1
-
-def start_copying(zip_list):
-    global copy_process
-    copy_process = multiprocessing.Process(
+            # Don't write into the old file, since it may be hardlinked
+            # into a game.
+            try:
+                os.remove(os.path.join(cache_path, entry[1]))
+            except FileNotFoundError:
+                pass
+            to_extract[entry[0]].append(entry[1])
+
+    # Images are extracted by the package loader, but are included in
+    # the progress.
+    images = sum(
+        pak_file.is_image
+        for index in zip_index.values()
+        for pak_file in index.values()
+    )
+    # The loader's count includes files duplicated between packages, which
+    # are only extracted once.
+    res_count = len(manifest) + images
+    with currently_done.get_lock():
+        done_files.value += unchanged + images
+
+    print('Extracting {} resources, {} unchanged.'.format(
+        len(manifest) - unchanged,
+        unchanged,
+    ))
+
+    jobs = []
+    folders = set()
+    for zip_path, members in to_extract.items():
+        for i in range(0, len(members), JOB_SIZE):
+            jobs.append((zip_path, members[i:i + JOB_SIZE]))
+        for member in members:
+            folders.add(os.path.dirname(os.path.join(cache_path, member)))
+    # Make the folders first, so workers don't race to create them.
+    for folder in folders:
+        os.makedirs(folder, exist_ok=True)
+
+    # Start with the biggest jobs, so the workers finish together.
+    jobs.sort(key=lambda job: len(job[1]), reverse=True)
+    worker_count = min(multiprocessing.cpu_count(), len(jobs))
+
+    job_queue = multiprocessing.Queue()
+    for job in jobs:
+        job_queue.put(job)
+    for _ in range(worker_count):
+        job_queue.put(None)  # Tell each worker to stop.
+
+    workers = [
+        multiprocessing.Process(
+            target=packageWorker.extract_resources,
+            args=(job_queue, done_files, cache_path),
+            daemon=True,
+        )
+        for _ in range(worker_count)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    if any(worker.exitcode != 0 for worker in workers):
+        # The manifest stays deleted, so everything is redone next time.
+        print('Failed to extract resources!')
+    else:
+        save_manifest(MANIFEST_FILE, manifest)
+
+
+def start_copying(zip_list, zip_index):
+    """Begin extracting resources.
+
+    A thread decides which files need to be copied, then waits for the
+    worker processes doing the extraction.
+    """
+    global copy_thread
+    copy_thread = threading.Thread(
         target=do_copy,
-        args=(zip_list, currently_done),
+        args=(zip_list, zip_index, currently_done),
+        daemon=True,
     )
-    copy_process.daemon = True
-    print(copy_process)
-    print('Starting background process!')
-    copy_process.start()
+    print('Starting background extraction!')
+    copy_thread.start()
     TK_ROOT.after(UPDATE_INTERVAL, update)
 
 def update():
@@ -72,7 +219,7 @@ def update():
             res_count,
         )
     )
-    if not copy_process.is_alive():
+    if not copy_thread.is_alive():
         # We've finished copying
         export_btn_text.set(
             'Export...'
@@ -8,6 +8,8 @@ Does stuff related to the actual games.
 import os
 import os.path
 import shutil
+import time
+import hashlib
 
 from tkinter import *  # ui library
 from tkinter import messagebox  # simple, standard modal dialogs
@@ -15,12 +17,14 @@ from tkinter import filedialog  # open/save as dialog creator
 from tk_root import TK_ROOT
 
 from query_dialogs import ask_string
-from BEE2_config import ConfigFile
+from BEE2_config import ConfigFile, GEN_OPTS
 from property_parser import Property
 import utils
 import UI
 import loadScreen
 import extract_packages
+import packageWorker
+import resourceDeploy
 
 all_games = []
 selected_game = None
@@ -57,6 +61,9 @@ _UNLOCK_ITEMS = [
 # The location of all the instances in the game directory
 INST_PATH = 'sdk_content/maps/instances/BEE2'
 
+# Records the resources copied into the game, relative to the game folder.
+GAME_MANIFEST = 'bee2/resources_manifest.json'
+
 # The line we inject to add our BEE2 folder into the game search path.
 # We always add ours such that it's the highest priority, other
 # than '|gameinfo_path|.'
@@ -139,7 +146,10 @@ class Game:
         return os.path.normcase(os.path.join(self.root, path))
 
     def add_editor_sounds(self, sounds: Property):
-        """Add soundscript items so they can be used in the editor."""
+        """Add soundscript items so they can be used in the editor.
+
+        Returns True if the soundscript was modified.
+        """
         # PeTI only loads game_sounds_editor, so we must modify that.
         # First find the highest-priority file
         for folder in self.dlc_priority():
@@ -169,13 +179,11 @@ class Game:
                 del file_data[i:]
 
         # Then add our stuff!
-        with open(file, 'w') as f:
-            f.writelines(file_data)
-            f.write(EDITOR_SOUND_LINE + '\n')
-            for sound in sounds:
-                for line in sound.data.export():
-                    f.write(line)
-                f.write('\n')  # Add a little spacing
+        file_data.append(EDITOR_SOUND_LINE + '\n')
+        for sound in sounds:
+            file_data.append(str(sound.data))
+            file_data.append('\n')  # Add a little spacing
+        return write_if_changed(file, ''.join(file_data))
 
     def edit_gameinfo(self, add_line=False):
         """Modify all gameinfo.txt files to add or remove our line.
@@ -193,7 +201,8 @@ class Game:
                     clean_line = utils.clean_line(line)
                     if add_line:
                         if clean_line == GAMEINFO_LINE:
-                            break  # Already added!
+                            data = None  # Already added!
+                            break
                         elif '|gameinfo_path|' in clean_line:
                             print("Adding gameinfo hook to " + info_path)
                             # Match the line's indentation
@@ -216,6 +225,8 @@ class Game:
                         )
                     continue
 
+                if data is None:
+                    continue
                 with open(info_path, 'w') as file:
                     for line in data:
                         file.write(line)
@@ -234,32 +245,105 @@ class Game:
             self.clear_cache()
 
     def refresh_cache(self):
-        """Copy over the resource files into this game."""
+        """Copy over the resource files into this game.
 
-        screen_func = export_screen.step
-        copy2 = shutil.copy2
+        A manifest of the copied files is kept in the game, so only
+        files which changed since the last export are copied. Files which
+        were removed from the packages are deleted.
+        """
+        start_time = time.perf_counter()
+        deployer = resourceDeploy.Deployer(
+            GEN_OPTS.get_val('General', 'resource_deploy', 'auto'),
+        )
 
-        def copy_func(src, dest):
-            screen_func('RES')
-            copy2(src, dest)
+        resources = extract_packages.load_manifest(
+            extract_packages.MANIFEST_FILE,
+        )
+        if resources is None:
+            resources = scan_resources('../cache/')
+        # res_count includes images and duplicate files, so use the
+        # real number of resources for the progress bar.
+        export_screen.set_length('RES', len(resources))
+
+        manifest_path = self.abs_path(GAME_MANIFEST)
+        old_manifest = extract_packages.load_manifest(manifest_path)
+        if old_manifest is None:
+            # We don't know what's been copied, so start from scratch.
+            print('No resource manifest, replacing all resources.')
+            for folder in ('bee2/', INST_PATH):
+                shutil.rmtree(self.abs_path(folder), ignore_errors=True)
+            old_manifest = {}
+        else:
+            # Don't trust it if we fail partway through.
+            os.remove(manifest_path)
+
+        manifest = {}
+        copied = 0
+        # Unchanged files are added to the progress bar in bulk.
+        steps = 0
+        for path, entry in resources.items():
+            steps += 1
+            dest = self.resource_dest(entry[1])
+            if dest is None:
+                continue
+            manifest[path] = entry
+            old_entry = old_manifest.get(path)
+            if old_entry == entry and os.path.isfile(dest):
+                continue
+            if old_entry is not None and old_entry[1] != entry[1]:
+                # The name changed case, remove the old file.
+                self.remove_resource(old_entry[1])
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            deployer.deploy(os.path.join('../cache/', entry[1]), dest)
+            copied += 1
+            export_screen.step('RES', steps)
+            steps = 0
+        export_screen.step('RES', steps)
+
+        removed = 0
+        for path, entry in old_manifest.items():
+            if path not in manifest:
+                self.remove_resource(entry[1])
+                removed += 1
+
+        extract_packages.save_manifest(manifest_path, manifest)
+        print(
+            'Copied {} resources, removed {}, {} unchanged '
+            'in {:.2f}s.'.format(
+                copied,
+                removed,
+                len(manifest) - copied,
+                time.perf_counter() - start_time,
+            )
+        )
+        deployer.summary()
 
-        for folder in os.listdir('../cache/resources/'):
-            source = os.path.join('../cache/resources/', folder)
-            if folder == 'instances':
-                dest = self.abs_path(INST_PATH)
-            elif folder.casefold() == 'bee2':
-                continue  # Skip app icons
-            else:
-                dest = self.abs_path(os.path.join('bee2', folder))
-            print('Copying to "' + dest + '" ...', end='')
+    def resource_dest(self, member):
+        """Get the location in the game a resource is copied to.
+
+        member is the path in the package, starting with 'resources/'.
+        None is returned for files which aren't copied.
+        """
+        parts = packageWorker.norm_path(member).split('/')
+        if len(parts) < 3:
+            return None
+        folder = parts[1].casefold()
+        if folder == 'instances':
+            return self.abs_path(os.path.join(INST_PATH, *parts[2:]))
+        elif folder == 'bee2':
+            return None  # Skip app icons
+        else:
+            return self.abs_path(os.path.join('bee2', *parts[1:]))
+
+    def remove_resource(self, member):
+        """Delete a copied resource from the game."""
+        dest = self.resource_dest(member)
+        if dest is not None:
             try:
-                shutil.rmtree(dest)
-            except (IOError, shutil.Error):
+                os.remove(dest)
+            except FileNotFoundError:
                 pass
 
-            shutil.copytree(source, dest, copy_function=copy_func)
-            print(' Done!')
-
     def clear_cache(self):
         """Remove all resources from the game."""
         shutil.rmtree(self.abs_path(INST_PATH), ignore_errors=True)
@@ -488,35 +572,29 @@ class Game:
 
         export_screen.step('CONF')
 
-        print('Writing Editoritems!')
+        # Each file is rendered, and only written if it's different to
+        # the one already in the game.
+        changed = []
         os.makedirs(self.abs_path('portal2_dlc2/scripts/'), exist_ok=True)
-        with open(self.abs_path(
-                'portal2_dlc2/scripts/editoritems.txt'), 'w') as editor_file:
-            for line in editoritems.export():
-                editor_file.write(line)
-        export_screen.step('CONF')
-
-        print('Writing VBSP Config!')
         os.makedirs(self.abs_path('bin/bee2/'), exist_ok=True)
-        with open(self.abs_path('bin/bee2/vbsp_config.cfg'), 'w') as vbsp_file:
-            for line in vbsp_config.export():
-                vbsp_file.write(line)
-        export_screen.step('CONF')
-
-        print('Writing instance list!')
-        with open(self.abs_path('bin/bee2/instances.cfg'), 'w') as inst_file:
-            for line in all_instances.export():
-                inst_file.write(line)
-        export_screen.step('CONF')
-
-        print('Writing packing list!')
-        with open(self.abs_path('bin/bee2/pack_list.cfg'), 'w') as pack_file:
-            for line in pack_block.export():
-                pack_file.write(line)
-        export_screen.step('CONF')
+        for name, path, prop_block in [
+                ('editoritems', 'portal2_dlc2/scripts/editoritems.txt',
+                    editoritems),
+                ('VBSP config', 'bin/bee2/vbsp_config.cfg', vbsp_config),
+                ('instance list', 'bin/bee2/instances.cfg', all_instances),
+                ('packing list', 'bin/bee2/pack_list.cfg', pack_block),
+                ]:
+            print('Writing ' + name + '!')
+            if write_if_changed(
+                    self.abs_path(path),
+                    str(prop_block),
+                    ):
+                changed.append(path)
+            export_screen.step('CONF')
 
         print('Editing game_sounds!')
-        self.add_editor_sounds(editor_sounds.values())
+        if self.add_editor_sounds(editor_sounds.values()):
+            changed.append('game_sounds_editor.txt')
         export_screen.step('CONF')
 
         if voice is not None:
@@ -530,10 +608,11 @@ class Game:
                 )
                 print(path)
                 if os.path.isfile(path):
-                    shutil.copy(
-                        path,
-                        self.abs_path('bin/bee2/{}voice.cfg'.format(dest))
-                    )
+                    if copy_if_changed(
+                            path,
+                            self.abs_path('bin/bee2/{}voice.cfg'.format(dest))
+                            ):
+                        changed.append('bin/bee2/{}voice.cfg'.format(dest))
                     print('Written "{}voice.cfg"'.format(dest))
                 else:
                     print('No ' + pretty + ' voice config!')
@@ -542,12 +621,20 @@ class Game:
         print('Copying Custom Compiler!')
         for file in os.listdir('../compiler'):
             print('\t* compiler/{0} -> bin/{0}'.format(file))
-            shutil.copy(
-                os.path.join('../compiler', file),
-                self.abs_path('bin/')
-            )
+            if copy_if_changed(
+                    os.path.join('../compiler', file),
+                    self.abs_path(os.path.join('bin', file)),
+                    ):
+                changed.append('bin/' + file)
             export_screen.step('COMP')
 
+        if changed:
+            print('Changed files:')
+            for path in changed:
+                print(' - ' + path)
+        else:
+            print('No files changed.')
+
         if should_refresh:
             print('Copying Resources!')
             self.refresh_cache()
@@ -556,6 +643,73 @@ class Game:
         export_screen.reset()  # Hide loading screen, we're done
 
 
+def hash_file(path):
+    """Compute the SHA-1 of a file's contents."""
+    sha = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(64 * 1024), b''):
+            sha.update(chunk)
+    return sha.digest()
+
+
+def write_if_changed(path, text):
+    """Write text to a file, unless it already contains it.
+
+    Returns True if the file was written.
+    """
+    try:
+        with open(path) as file:
+            old_hash = hashlib.sha1(file.read().encode('utf8')).digest()
+    except (FileNotFoundError, UnicodeDecodeError):
+        old_hash = None
+    if old_hash == hashlib.sha1(text.encode('utf8')).digest():
+        return False
+    with open(path, 'w') as file:
+        file.write(text)
+    return True
+
+
+def copy_if_changed(src, dest):
+    """Copy a file, unless the destination is already identical.
+
+    Returns True if the file was copied.
+    """
+    try:
+        if (
+                os.path.getsize(src) == os.path.getsize(dest) and
+                hash_file(src) == hash_file(dest)
+                ):
+            return False
+    except FileNotFoundError:
+        pass
+    shutil.copy(src, dest)
+    return True
+
+
+def scan_resources(cache_path):
+    """Build a resource manifest from the files in the cache folder.
+
+    This is used if the manifest from extract_packages is missing. The
+    modification time is used instead of the CRC.
+    """
+    manifest = {}
+    base = os.path.join(cache_path, 'resources')
+    for dirpath, dirnames, filenames in os.walk(base):
+        for name in filenames:
+            full_path = os.path.join(dirpath, name)
+            member = packageWorker.norm_path(
+                os.path.relpath(full_path, cache_path)
+            )
+            stat = os.stat(full_path)
+            manifest[member.casefold()] = [
+                None,
+                member,
+                stat.st_size,
+                stat.st_mtime_ns,
+            ]
+    return manifest
+
+
 def find_steam_info(game_dir):
     """Determine the steam ID and game name of this folder, if it has one.
 
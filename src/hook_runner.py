@@ -0,0 +1,187 @@
+"""Run the original VBSP and VRAD, and record how long they take.
+
+The compilers are launched directly (without a shell). Reader threads
+drain stdout and stderr so neither pipe can fill up and stall the
+compiler. The output is echoed unchanged, since Portal 2 parses it for
+progress, and logged with timestamps to a separate file.
+"""
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+import utils
+
+# Valve's compilers report how long each phase took. These match the
+# lines that finish a phase - the 'name' and 'time' (in seconds) groups
+# are recorded.
+PHASE_MATCHERS = [
+    # "BuildFacelights: 0...1...2...3...4...5...6...7...8...9...10 (3)"
+    re.compile(
+        r'^(?P<name>[^:.]+?):?\s*(?:\d+\.\.\.)+\d+\s*\((?P<time>\d+)\)\s*$'
+    ),
+    # "Build Patch/Sample Hash Table(s).....Done<0.0012 sec>"
+    re.compile(
+        r'^(?P<name>.+?)\.*\s*Done\s*<(?P<time>[0-9.]+) sec>'
+    ),
+]
+# The total compile time, printed at the end: "(13 seconds elapsed)"
+TOTAL_MATCHER = re.compile(r'\((?P<time>[0-9.]+) seconds elapsed\)')
+
+# Where the timestamped output and phase timings of each compiler go.
+OUTPUT_LOG = 'bee2/{}_output.log'
+CHUNK_SIZE = 4096
+
+
+def get_exe(name):
+    """Get the location of the original compiler with the given name.
+
+    The original compilers have '_original' appended to their name,
+    after the OS suffix.
+    """
+    if utils.MAC:
+        os_suff = '_osx'
+    elif utils.LINUX:
+        os_suff = '_linux'
+    else:
+        os_suff = ''
+
+    return os.path.normpath(
+        os.path.join(os.getcwd(), name + os_suff + '_original')
+    )
+
+
+def parse_phase(line):
+    """Check a line of output for a finished compile phase.
+
+    This returns (name, seconds), or None if it isn't a phase line.
+    """
+    for matcher in PHASE_MATCHERS:
+        match = matcher.match(line)
+        if match:
+            return (
+                match.group('name').strip(),
+                utils.conv_float(match.group('time')),
+            )
+    match = TOTAL_MATCHER.search(line)
+    if match:
+        return 'Total', utils.conv_float(match.group('time'))
+    return None
+
+
+def _tee_pipe(pipe, console, log, lines, prefix=''):
+    """Copy a pipe to the console unchanged, and log it with timestamps.
+
+    This runs in a thread, so the pipe can't fill up and stall the
+    compiler. Chunks are echoed as soon as they arrive, so progress
+    output like '0...1...2' isn't held back until the line ends.
+    Complete lines are added to lines.
+    """
+    console = getattr(console, 'buffer', console)
+    partial = b''
+    with pipe:
+        for chunk in iter(lambda: pipe.read1(CHUNK_SIZE), b''):
+            try:
+                console.write(chunk)
+                console.flush()
+            except (OSError, ValueError, TypeError):
+                pass  # No console, just log it.
+            *new_lines, partial = (partial + chunk).split(b'\n')
+            for line in new_lines:
+                line = line.decode(errors='replace').rstrip('\r')
+                log(prefix + line)
+                lines.append(line)
+    if partial:
+        line = partial.decode(errors='replace').rstrip('\r')
+        log(prefix + line)
+        lines.append(line)
+
+
+def run_compiler(name, args, exe=None):
+    """Execute an original compiler, and log its output as it appears.
+
+    - name is the compiler name ('vbsp', 'vrad') used in the log.
+    - args are the arguments passed to the compiler, blank args are skipped.
+    - exe overrides the executable, otherwise get_exe(name) is used.
+    The output is passed through to our stdout and stderr unchanged, since
+    Portal 2 reads the progress from it. Each line is also written to
+    OUTPUT_LOG, with the time since the compiler was launched.
+    This returns the exit code, and a list of (phase, seconds) tuples
+    parsed from the compiler's output.
+    """
+    if exe is None:
+        exe = get_exe(name)
+    cmd_args = [exe] + [arg for arg in args if arg]
+
+    utils.con_log('Calling original ' + name.upper() + '...')
+    utils.con_log(subprocess.list2cmdline(cmd_args))
+
+    out_lines = []
+    err_lines = []
+    output_log = OUTPUT_LOG.format(name)
+    os.makedirs(os.path.dirname(output_log), exist_ok=True)
+    with open(output_log, 'w') as log_file:
+        log_file.write(subprocess.list2cmdline(cmd_args) + '\n')
+        log_lock = threading.Lock()
+        start_time = time.perf_counter()
+
+        def log(line):
+            """Write a timestamped line to the output log."""
+            with log_lock:
+                log_file.write('[{:8.2f}] {}\n'.format(
+                    time.perf_counter() - start_time,
+                    line,
+                ))
+                log_file.flush()
+
+        # Our own output needs to be written before the compiler's appears.
+        sys.stdout.flush()
+        try:
+            proc = subprocess.Popen(
+                cmd_args,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+        except OSError as e:
+            # Missing or renamed compiler.
+            log('Could not start {}: {!r}'.format(name.upper(), e))
+            utils.con_log('Could not start {}: {!r}'.format(name.upper(), e))
+            return 1, []
+
+        readers = [
+            threading.Thread(
+                target=_tee_pipe,
+                args=(proc.stdout, sys.stdout, log, out_lines),
+                daemon=True,
+            ),
+            threading.Thread(
+                target=_tee_pipe,
+                args=(proc.stderr, sys.stderr, log, err_lines, '! '),
+                daemon=True,
+            ),
+        ]
+        for thread in readers:
+            thread.start()
+        for thread in readers:
+            thread.join()
+        code = proc.wait()
+        duration = time.perf_counter() - start_time
+
+        phases = []
+        for line in out_lines:
+            phase = parse_phase(line)
+            if phase is not None:
+                phases.append(phase)
+
+        log('Exited with {}'.format(code))
+        for phase_name, seconds in phases:
+            log_file.write(' - {}: {:g}s\n'.format(phase_name, seconds))
+
+    utils.con_log('{} finished in {:.2f}s, output logged to "{}"'.format(
+        name.upper(),
+        duration,
+        output_log,
+    ))
+    return code, phases
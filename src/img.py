@@ -2,12 +2,61 @@
 
 The image is saved in the dictionary, so it stays in memory. Otherwise
 it could get deleted, which will make the rendered image vanish.
+Images which aren't shown anywhere are discarded once more than
+MAX_CACHED are loaded.
+
+Resized images are also saved to the disk cache, so later launches don't
+need to decode and resample the originals.
+
+png_async() and icon_async() decode images in background threads. Only
+creating the PhotoImage happens on the Tk thread.
 """
 
+import hashlib
+import os
 import os.path
+import queue
+import threading
+import time
+from collections import OrderedDict, Counter
+from concurrent.futures import ThreadPoolExecutor
 from PIL import ImageTk, Image
 
-cached_img = {}
+from tk_root import TK_ROOT
+
+# (path, resize_to, algo) -> PhotoImage, in order of last use.
+cached_img = OrderedDict()
+
+# The number of images to keep loaded, if they aren't in use.
+MAX_CACHED = 1024
+
+# Resized copies of images are kept here.
+DISK_CACHE = os.path.join('..', 'cache', 'thumbnails')
+# Thumbnails not used for this long are deleted.
+DISK_CACHE_MAX_AGE = 30 * 24 * 60 * 60  # 30 days
+
+# (path, size, mtime) -> SHA-1 of the file, so images are only hashed
+# again if they change.
+_file_hashes = {}
+
+# Hits and misses for the memory and disk caches.
+stats = Counter()
+stats_lock = threading.Lock()
+
+# The threads used to decode images for png_async().
+LOADER_THREADS = 4
+# Milliseconds between checks for decoded images.
+POLL_INTERVAL = 20
+# How long to spend creating PhotoImages each time, so the UI stays
+# responsive.
+POLL_TIME = 0.01
+
+_loader_pool = ThreadPoolExecutor(max_workers=LOADER_THREADS)
+# Decoded (key, Image) pairs, waiting for the Tk thread.
+_loaded_queue = queue.Queue()
+# Key -> list of (callback, error) for images being loaded.
+_pending = {}
+
 
 def png(path, resize_to=None, error=None, algo=Image.LANCZOS):
     """Loads in an image for use in TKinter.
@@ -18,13 +67,122 @@ def png(path, resize_to=None, error=None, algo=Image.LANCZOS):
     - If resize_to is set, the image will be resized to that size using the algo
     algorithm.
     """
+    key = _cache_key(path, resize_to, algo)
+    img = _get_cached(key)
+    if img is not None:
+        return img
+
+    path = _find_file(key[0])
+    if path is None:
+        return error or img_error
+
+    img = ImageTk.PhotoImage(image=load_image(path, resize_to, algo))
+    _add_cached(key, img)
+    return img
+
+
+def png_async(
+        path,
+        callback,
+        resize_to=None,
+        error=None,
+        algo=Image.LANCZOS,
+        placeholder=None,
+        ):
+    """Load an image in the background.
+
+    The arguments are the same as png(). If the image is already loaded,
+    it's returned immediately. Otherwise placeholder (or a blank image) is
+    returned, and callback(image) is called from the Tk thread once it's
+    ready.
+    """
+    key = _cache_key(path, resize_to, algo)
+    img = _get_cached(key)
+    if img is not None:
+        return img
+
+    if key in _pending:
+        # Already being loaded.
+        _pending[key].append((callback, error))
+        return placeholder or img_blank
+
+    path = _find_file(key[0])
+    if path is None:
+        return error or img_error
+
+    if not _pending:
+        TK_ROOT.after(POLL_INTERVAL, _process_loaded)
+    _pending[key] = [(callback, error)]
+    _loader_pool.submit(_decode, key, path, resize_to, algo)
+    return placeholder or img_blank
+
+
+def _decode(key, path, resize_to, algo):
+    """Decode an image in a background thread."""
+    try:
+        image = load_image(path, resize_to, algo)
+        image.load()
+    except Exception as e:
+        print('ERROR: Could not load "{}": {!r}'.format(path, e))
+        image = None
+    _loaded_queue.put((key, image))
+
+
+def _process_loaded():
+    """Create PhotoImages for decoded images, and pass them on.
+
+    This runs on the Tk thread, until no images are waiting.
+    """
+    end_time = time.perf_counter() + POLL_TIME
+    while time.perf_counter() < end_time:
+        try:
+            key, image = _loaded_queue.get_nowait()
+        except queue.Empty:
+            break
+        if image is None:
+            img = None
+        else:
+            img = ImageTk.PhotoImage(image=image)
+            _add_cached(key, img)
+        for callback, error in _pending.pop(key, ()):
+            callback(img or error or img_error)
+    if _pending:
+        TK_ROOT.after(POLL_INTERVAL, _process_loaded)
+
+
+def _cache_key(path, resize_to, algo):
+    """Get the key used for an image in cached_img."""
     if not path.casefold().endswith(".png"):
         path += ".png"
-    orig_path = path
+    return path, resize_to, algo
 
-    if (orig_path, resize_to) in cached_img:
-        return cached_img[orig_path, resize_to]
 
+def _get_cached(key):
+    """Return an image from the memory cache, or None if it isn't loaded."""
+    try:
+        img = cached_img[key]
+    except KeyError:
+        stats['mem_miss'] += 1
+        return None
+    else:
+        stats['mem_hit'] += 1
+        cached_img.move_to_end(key)
+        return img
+
+
+def _add_cached(key, img):
+    """Add an image to the memory cache."""
+    cached_img[key] = img
+    if len(cached_img) > MAX_CACHED:
+        discard_unused()
+
+
+def _find_file(path):
+    """Locate an image in the images folder, or the extracted images.
+
+    None is returned if it doesn't exist.
+    """
+    orig_path = path
     base_path = os.path.abspath(
         os.path.join(
             os.getcwd(),
@@ -50,17 +208,110 @@ def png(path, resize_to=None, error=None, algo=Image.LANCZOS):
         path = cache_path
 
     if os.path.isfile(path):
-        image = Image.open(path)
+        return path
     else:
         print('ERROR: "images/' + orig_path + '" does not exist!')
-        return error or img_error
+        return None
 
-    if resize_to:
-        image = image.resize((resize_to, resize_to), algo)
 
-    img = ImageTk.PhotoImage(image=image)
-    cached_img[path, resize_to] = img
-    return img
+def load_image(path, resize_to, algo):
+    """Read an image file, resizing it if needed.
+
+    Resized images are read from the disk cache if possible.
+    Since images/cache is extracted again each launch, thumbnails are
+    keyed by the contents of the image, not the modification time. The
+    hash is reused while the file's size and modification time match.
+    """
+    if not resize_to:
+        return Image.open(path)
+
+    thumb_path = os.path.join(DISK_CACHE, '{}_{}_{}.png'.format(
+        _file_hash(path),
+        resize_to,
+        int(algo),
+    ))
+
+    try:
+        image = Image.open(thumb_path)
+        image.load()
+    except (OSError, ValueError):
+        with stats_lock:
+            stats['disk_miss'] += 1
+    else:
+        with stats_lock:
+            stats['disk_hit'] += 1
+        try:
+            os.utime(thumb_path)  # Mark it as used.
+        except OSError:
+            pass
+        return image
+
+    image = Image.open(path).resize((resize_to, resize_to), algo)
+    try:
+        os.makedirs(DISK_CACHE, exist_ok=True)
+        image.save(thumb_path + '.tmp', 'PNG')
+        os.replace(thumb_path + '.tmp', thumb_path)
+    except OSError as e:
+        print('Could not cache "{}": {!r}'.format(path, e))
+    return image
+
+
+def _file_hash(path):
+    """Get the SHA-1 of a file, only reading it if it's changed."""
+    stat = os.stat(path)
+    key = path, stat.st_size, stat.st_mtime_ns
+    try:
+        return _file_hashes[key]
+    except KeyError:
+        pass
+    with open(path, 'rb') as file:
+        digest = hashlib.sha1(file.read()).hexdigest()
+    _file_hashes[key] = digest
+    return digest
+
+
+def discard_unused():
+    """Remove the least recently used images not shown in any widget."""
+    for key, img in list(cached_img.items()):
+        if len(cached_img) <= MAX_CACHED:
+            break
+        # Tk knows if any widget is showing the image.
+        if not TK_ROOT.tk.getboolean(
+                TK_ROOT.tk.call('image', 'inuse', str(img))
+                ):
+            del cached_img[key]
+            stats['discarded'] += 1
+
+
+def clean_disk_cache():
+    """Delete thumbnails which haven't been used recently."""
+    if not os.path.isdir(DISK_CACHE):
+        return
+    oldest = time.time() - DISK_CACHE_MAX_AGE
+    with os.scandir(DISK_CACHE) as entries:
+        for entry in entries:
+            try:
+                if entry.stat().st_mtime < oldest:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def print_stats():
+    """Log the hit rates of the image caches."""
+    for cache in ('mem', 'disk'):
+        hits = stats[cache + '_hit']
+        total = hits + stats[cache + '_miss']
+        print('{} image cache: {}/{} hits ({:.0%})'.format(
+            cache.title(),
+            hits,
+            total,
+            hits / total if total else 0,
+        ))
+    print('{} images loaded, {} discarded.'.format(
+        len(cached_img),
+        stats['discarded'],
+    ))
 
 
 def spr(name, error=None):
@@ -75,5 +326,23 @@ def icon(name, error=None):
     return png(os.path.join("items", name), error=error, resize_to=64)
 
 
+def icon_async(name, callback, error=None):
+    """Load in a palette icon in the background.
+
+    See png_async().
+    """
+    return png_async(
+        os.path.join("items", name),
+        callback,
+        error=error,
+        resize_to=64,
+    )
+
+
+# Scanning the thumbnails can be slow, so don't hold up startup.
+threading.Thread(target=clean_disk_cache, daemon=True).start()
+
 # If image is not readable, use this instead
-img_error = png('BEE2/error')
\ No newline at end of file
+img_error = png('BEE2/error')
+# Shown while images are loading.
+img_blank = png('BEE2/blank')
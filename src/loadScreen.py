@@ -2,9 +2,15 @@
 from tkinter import *  # ui library
 from tk_root import TK_ROOT
 from tkinter import ttk  # themed ui components that match the OS
+import time
 
 import utils
 
+# Redraw the screen at most this often (in seconds), since some stages
+# step thousands of times.
+REDRAW_INTERVAL = 0.04
+
+
 class LoadScreen(Toplevel):
     def __init__(self, *stages, title_text='Loading'):
         self.stages = list(stages)
@@ -14,6 +20,8 @@ class LoadScreen(Toplevel):
         self.bar_val = {}
         self.maxes = {}
         self.num_images = 0
+        # The time each stage was last redrawn.
+        self.last_redraw = {}
 
         self.active = True
         # active determines whether the screen is on, and if False stops most
@@ -60,6 +68,7 @@ class LoadScreen(Toplevel):
             self.bar_var[st_id] = IntVar()
             self.bar_val[st_id] = 0
             self.maxes[st_id] = 10
+            self.last_redraw[st_id] = 0
 
             self.widgets[st_id] = ttk.Progressbar(
                 self.frame,
@@ -91,15 +100,26 @@ class LoadScreen(Toplevel):
             self.maxes[stage] = num
             self.set_nums(stage)
 
-    def step(self, stage):
-        """Increment a step by one."""
+    def step(self, stage, num=1):
+        """Increment a stage by num steps.
+
+        The screen is only redrawn every REDRAW_INTERVAL seconds, or
+        when the stage finishes.
+        """
         if self.active:
-            self.bar_val[stage] += 1
+            self.bar_val[stage] += num
+            cur_time = time.perf_counter()
+            if (
+                    cur_time - self.last_redraw[stage] < REDRAW_INTERVAL
+                    and self.bar_val[stage] < self.maxes[stage]
+                    ):
+                return
+            self.last_redraw[stage] = cur_time
             self.bar_var[stage].set(
                 1000 * self.bar_val[stage] / self.maxes[stage]
             )
-            self.widgets[stage].update()
             self.set_nums(stage)
+            self.widgets[stage].update()
 
     def set_nums(self, stage):
         self.labels[stage]['text'] = '{!s}/{!s}'.format(
@@ -120,6 +140,7 @@ class LoadScreen(Toplevel):
         for stage, _ in self.stages:
             self.maxes[stage] = 10
             self.bar_val[stage] = 0
+            self.last_redraw[stage] = 0
             self.bar_var[stage].set(0)
             self.labels[stage]['text'] = '0/??'
             self.set_nums(stage)
@@ -0,0 +1,89 @@
+"""Stores the parsed objects from each package, so unchanged packages don't
+need to be parsed on every launch.
+
+Each package has a pickle file in CACHE_DIR. Entries are only used if the
+package's size, modification time and contents hash all match, and they
+were written by the same parser version.
+"""
+import hashlib
+import os
+import pickle
+
+import utils
+
+CACHE_DIR = os.path.join('..', 'cache', 'packages')
+
+# Increment this whenever the parsed objects change, so old caches are
+# discarded.
+PARSER_VERSION = 5
+
+
+def cache_filename(pak_path):
+    """Get the location of the cache file for a package."""
+    pak_path = os.path.normcase(os.path.abspath(pak_path))
+    return os.path.join(
+        CACHE_DIR,
+        '{}_{}.pickle'.format(
+            os.path.splitext(os.path.basename(pak_path))[0],
+            hashlib.md5(pak_path.encode('utf8')).hexdigest()[:12],
+        ),
+    )
+
+
+def pak_key(pak_path, index):
+    """Compute the key identifying the state of a package.
+
+    index is the package's index from packageWorker.index_package().
+    The hash covers the names, sizes and CRCs of each file (for folders,
+    the modification times instead of CRCs).
+    """
+    stat = os.stat(pak_path)
+    sha = hashlib.sha1()
+    for path in sorted(index):
+        entry = index[path]
+        sha.update('{}\0{}\0{}\n'.format(
+            entry.member, entry.size, entry.crc,
+        ).encode('utf8'))
+    return (
+        PARSER_VERSION,
+        utils.BEE_VERSION,
+        stat.st_size,
+        stat.st_mtime_ns,
+        sha.hexdigest(),
+    )
+
+
+def load(pak_path, key):
+    """Read the cached data for a package.
+
+    None is returned if there isn't a valid cache entry for this key.
+    """
+    try:
+        with open(cache_filename(pak_path), 'rb') as file:
+            cache_key, data = pickle.load(file)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        # Corrupt or from an incompatible version, just reparse.
+        print('Package cache for "{}" invalid: {!r}'.format(pak_path, e))
+        return None
+    if cache_key != key:
+        return None
+    return data
+
+
+def save(pak_path, key, data):
+    """Write the parsed data for a package into the cache."""
+    filename = cache_filename(pak_path)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    try:
+        with open(filename + '.tmp', 'wb') as file:
+            pickle.dump((key, data), file, pickle.HIGHEST_PROTOCOL)
+        os.replace(filename + '.tmp', filename)
+    except Exception as e:
+        # Not being able to cache shouldn't stop us from loading.
+        print('Could not cache "{}": {!r}'.format(pak_path, e))
+        try:
+            os.remove(filename + '.tmp')
+        except OSError:
+            pass
@@ -1,17 +1,23 @@
 """
 Handles scanning through the zip packages to find all items, styles, etc.
 """
+import copy
+import itertools
 import os
 import os.path
 import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from zipfile import ZipFile
-from collections import defaultdict, namedtuple
+from collections import defaultdict, namedtuple, Counter
 
 from property_parser import Property, NoKeyError
-from FakeZip import FakeZip, zip_names
+from FakeZip import FakeZip
 from selectorWin import SelitemData
 from loadScreen import main_loader as loader
 import extract_packages
+import packageCache
+import packageWorker
 import utils
 
 
@@ -34,9 +40,23 @@ data = {}
 
 res_count = -1
 
-ObjData = namedtuple('ObjData', 'zip_file, info_block, pak_id, disp_name')
+# Property trees parsed ahead of time by packageWorker, for each package.
+# pak_id -> {path: Property}
+preparsed = {}
+# The ItemMeta for each editoritems, also from packageWorker.
+# pak_id -> {path: ItemMeta}
+preparsed_meta = {}
+
+# Packages reopened by read_package_file(), to read data after loading.
+lazy_zips = {}
+
+# key identifies the block inside the package - (is_override, index).
+ObjData = namedtuple('ObjData', 'zip_file, info_block, pak_id, disp_name, key')
 ParseData = namedtuple('ParseData', 'zip_file, id, info, pak_id')
-PackageData = namedtuple('package_data', 'zip_file, info, name, disp_name')
+PackageData = namedtuple(
+    'package_data',
+    'zip_file, info, name, disp_name, index',
+)
 ObjType = namedtuple('ObjType', 'cls, allow_mult, has_img')
 
 
@@ -79,6 +99,81 @@ def reraise_keyerror(err, obj_id):
     ) from err
 
 
+def parse_prop_file(zip_file, path, pak_id):
+    """Parse a keyvalues file in a package.
+
+    If it was already parsed by preparse_packages(), that tree is used
+    instead. Like ZipFile.open(), this raises KeyError if the file is missing.
+    """
+    try:
+        # Each tree is only used once, so later users get a fresh copy.
+        return preparsed[pak_id].pop(packageWorker.norm_path(path))
+    except KeyError:
+        pass
+    with zip_file.open(path) as f:
+        return Property.parse(f, pak_id + ':' + path)
+
+
+def parse_item_meta(zip_file, path, pak_id):
+    """Get the ItemMeta for an editoritems file in a package.
+
+    If preparse_packages() already read it that's used, otherwise the
+    file is parsed now.
+    """
+    try:
+        return preparsed_meta[pak_id].pop(packageWorker.norm_path(path))
+    except KeyError:
+        pass
+    try:
+        return packageWorker.read_item_meta(
+            parse_prop_file(zip_file, path, pak_id)
+        )
+    except StopIteration:
+        raise ValueError(
+            '"{}:{}" has no Item block!'.format(pak_id, path)
+        ) from None
+
+
+def close_lazy_zips():
+    """Close the packages opened by read_package_file().
+
+    Open zips lock the files on Windows, so this is done whenever we're
+    finished reading from them.
+    """
+    for zip_file in lazy_zips.values():
+        zip_file.close()
+    lazy_zips.clear()
+
+
+def preparse_packages(skip=()):
+    """Parse the files in every package using a process pool.
+
+    The results are stored in preparsed, which parse_prop_file() reads
+    from. If the pool can't be used, the files will just be parsed when
+    they are needed instead. Packages with IDs in skip are ignored.
+    """
+    try:
+        with ProcessPoolExecutor() as pool:
+            futures = {
+                pool.submit(
+                    packageWorker.parse_package_files,
+                    pak_data.name,
+                    pak_id,
+                    [pak_file.member for pak_file in pak_data.index.values()],
+                ): pak_id
+                for pak_id, pak_data in packages.items()
+                if pak_id not in skip
+            }
+            for future in as_completed(futures):
+                pak_id = futures[future]
+                preparsed[pak_id], preparsed_meta[pak_id] = future.result()
+                loader.step("PAK")
+    except Exception as e:
+        # If this fails (a worker crashes, or can't start), fall back
+        # to serial parsing.
+        print('Parallel loading failed ({!r}), using serial!'.format(e))
+
+
 def get_config(prop_block, zip_file, folder, pak_id='', prop_name='config'):
     """Extract a config file refered to by the given property block.
 
@@ -98,10 +193,7 @@ def get_config(prop_block, zip_file, folder, pak_id='', prop_name='config'):
 
     path = os.path.join(folder, prop_block.value) + '.cfg'
     try:
-        with zip_file.open(path) as f:
-            return Property.parse(f,
-            pak_id + ':' + path,
-            )
+        return parse_prop_file(zip_file, path, pak_id)
     except KeyError:
         print('"{}:{}" not in zip!'.format(pak_id, path))
         return Property(None, [])
@@ -121,7 +213,10 @@ def find_packages(pak_dir, zips, zip_name_lst):
             utils.con_log('Extra file: ', name)
             continue
 
-        if 'info.txt' in zip_file.namelist():  # Is it valid?
+        # Read through the package once, everything else uses this.
+        index = packageWorker.index_package(zip_file)
+
+        if 'info.txt' in index:  # Is it valid?
             zips.append(zip_file)
             zip_name_lst.append(os.path.abspath(name))
             print('Reading package "' + name + '"')
@@ -134,6 +229,7 @@ def find_packages(pak_dir, zips, zip_name_lst):
                 info,
                 name,
                 disp_name,
+                index,
             )
             found_pak = True
         else:
@@ -153,8 +249,12 @@ def load_packages(
         log_item_fallbacks=False,
         log_missing_styles=False,
         log_missing_ent_count=False,
+        parallel=True,
         ):
-    """Scan and read in all packages in the specified directory."""
+    """Scan and read in all packages in the specified directory.
+
+    If parallel is true, package files are parsed using multiple processes.
+    """
     global LOG_ENT_COUNT
     pak_dir = os.path.abspath(os.path.join(os.getcwd(), '..', pak_dir))
 
@@ -180,9 +280,30 @@ def load_packages(
     data['zips'] = []
     try:
         find_packages(pak_dir, zips, data['zips'])
+        # Each package's index, for extract_packages.
+        data['zip_index'] = {
+            os.path.abspath(pak_data.name): pak_data.index
+            for pak_data in packages.values()
+        }
 
         loader.set_length("PAK", len(packages))
 
+        # Find the packages which haven't changed since the last launch.
+        load_start = time.perf_counter()
+        pak_keys = {}
+        cached = {}
+        for pak_id, pak_data in packages.items():
+            pak_keys[pak_id] = packageCache.pak_key(
+                pak_data.name,
+                pak_data.index,
+            )
+            cache_data = packageCache.load(pak_data.name, pak_keys[pak_id])
+            if cache_data is not None:
+                cached[pak_id] = cache_data
+
+        if parallel and len(cached) < len(packages):
+            preparse_packages(skip=cached)
+
         for obj_type in OBJ_TYPES:
             all_obj[obj_type] = {}
             obj_override[obj_type] = defaultdict(list)
@@ -190,22 +311,51 @@ def load_packages(
 
         objects = 0
         images = 0
-        for pak_id, (zip_file, info, name, dispName) in packages.items():
+        # The objects in each package, from parse_pak_objects().
+        pak_objects = {}
+        for pak_id, (zip_file, info, name, dispName, index) in packages.items():
             print(
                 ("Reading objects from '" + pak_id + "'...").ljust(50),
                 end=''
             )
-            obj_count, img_count = parse_package(
+            obj_count = parse_package(
                 zip_file,
                 info,
                 pak_id,
                 dispName,
             )
+            # The pool steps the packages it parsed. This covers the cached
+            # ones, and any left over if the pool failed partway.
+            if pak_id not in preparsed:
+                loader.step("PAK")
+            if obj_count is False:
+                continue
+
+            if pak_id in cached:
+                pak_objects[pak_id] = cached[pak_id]['objects']
+                pak_res_count = cached[pak_id]['res_count']
+                pak_img_count = cached[pak_id]['img_count']
+            else:
+                pak_objects[pak_id] = parse_pak_objects(zip_file, info, pak_id)
+                pak_res_count, pak_img_count = count_resources(index)
+                packageCache.save(name, pak_keys[pak_id], {
+                    'objects': pak_objects[pak_id],
+                    'res_count': pak_res_count,
+                    'img_count': pak_img_count,
+                })
+
+            extract_packages.res_count += pak_res_count
             objects += obj_count
-            images += img_count
-            loader.step("PAK")
+            images += pak_img_count
             print("Done!")
 
+        print('Loaded {} packages from the cache, and parsed {} '
+              'in {:.2f}s.'.format(
+                len(cached),
+                len(pak_objects) - len(cached),
+                time.perf_counter() - load_start,
+              ))
+
         loader.set_length("OBJ", objects)
         loader.set_length("IMG_EX", images)
 
@@ -221,52 +371,67 @@ def load_packages(
             )
         )
 
+        # Objects can be used multiple times (as both an original and an
+        # override), so count how many times each one is used. We need to
+        # copy them, except for the last use.
+        obj_uses = Counter(
+            (obj_type, obj_data.pak_id, obj_data.key)
+            for obj_type in OBJ_TYPES
+            for obj_data in itertools.chain(
+                all_obj[obj_type].values(),
+                itertools.chain.from_iterable(obj_override[obj_type].values()),
+            )
+        )
+
+        def get_object(obj_type, obj_data):
+            """Get the object for this ObjData."""
+            obj_key = (obj_type, obj_data.pak_id, obj_data.key)
+            obj_uses[obj_key] -= 1
+            object_ = pak_objects[obj_data.pak_id][obj_type, obj_data.key]
+            if obj_uses[obj_key]:
+                return copy.deepcopy(object_)
+            return object_
+
         for obj_type, objs in all_obj.items():
             for obj_id, obj_data in objs.items():
                 print("Loading " + obj_type + ' "' + obj_id + '"!')
-                # parse through the object and return the resultant class
-                try:
-                    object_ = OBJ_TYPES[obj_type].cls.parse(
-                        ParseData(
-                            obj_data.zip_file,
-                            obj_id,
-                            obj_data.info_block,
-                            obj_data.pak_id,
-                        )
-                    )
-                except (NoKeyError, IndexError) as e:
-                    reraise_keyerror(e, obj_id)
-
+                object_ = get_object(obj_type, obj_data)
                 object_.pak_id = obj_data.pak_id
                 object_.pak_name = obj_data.disp_name
                 for override_data in obj_override[obj_type].get(obj_id, []):
-                    override = OBJ_TYPES[obj_type].cls.parse(
-                        override_data
-                    )
-                    object_.add_over(override)
+                    object_.add_over(get_object(obj_type, override_data))
                 data[obj_type].append(object_)
                 loader.step("OBJ")
 
-        cache_folder = os.path.abspath('../cache/')
+        # Extract images into a separate folder, so the resources
+        # extracted by extract_packages are kept between launches.
+        img_folder = os.path.abspath('../cache/images/')
 
-        shutil.rmtree(cache_folder, ignore_errors=True)
-        img_loc = os.path.join('resources', 'bee2')
-        for zip_file in zips:
-            for path in zip_names(zip_file):
-                loc = os.path.normcase(path).casefold()
-                if loc.startswith(img_loc):
+        shutil.rmtree(img_folder, ignore_errors=True)
+        for pak_data in packages.values():
+            for pak_file in pak_data.index.values():
+                if pak_file.is_image:
                     loader.step("IMG_EX")
-                    zip_file.extract(path, path=cache_folder)
+                    pak_data.zip_file.extract(
+                        pak_file.member,
+                        path=img_folder,
+                    )
 
         shutil.rmtree('../images/cache', ignore_errors=True)
-        if os.path.isdir("../cache/resources/bee2"):
-            shutil.move("../cache/resources/bee2", "../images/cache")
-        shutil.rmtree('../cache/', ignore_errors=True)
+        if os.path.isdir(os.path.join(img_folder, 'resources', 'bee2')):
+            shutil.move(
+                os.path.join(img_folder, 'resources', 'bee2'),
+                '../images/cache',
+            )
+        shutil.rmtree(img_folder, ignore_errors=True)
 
     finally:
         # close them all, we've already read the contents.
         for z in zips:
             z.close()
+        preparsed.clear()
+        preparsed_meta.clear()
+        close_lazy_zips()
 
     print('Allocating styled items...')
     setup_style_tree(
@@ -281,7 +446,11 @@ def load_packages(
 
 
 def parse_package(zip_file, info, pak_id, disp_name):
-    """Parse through the given package to find all the components."""
+    """Parse through the given package to find all the components.
+
+    This returns the number of objects, or False if the package
+    can't be loaded.
+    """
     for pre in Property.find_key(info, 'Prerequisites', []).value:
         if pre.value not in packages:
             utils.con_log(
@@ -298,39 +467,64 @@ def parse_package(zip_file, info, pak_id, disp_name):
     for comp_type in OBJ_TYPES:
         allow_dupes = OBJ_TYPES[comp_type].allow_mult
         # Look for overrides
-        for obj in info.find_all("Overrides", comp_type):
+        for ind, obj in enumerate(info.find_all("Overrides", comp_type)):
             obj_id = obj['id']
             obj_override[comp_type][obj_id].append(
-                ParseData(zip_file, obj_id, obj, pak_id)
+                ObjData(zip_file, obj, pak_id, disp_name, (True, ind))
             )
 
-        for obj in info.find_all(comp_type):
+        for ind, obj in enumerate(info.find_all(comp_type)):
             obj_id = obj['id']
+            obj_data = ObjData(zip_file, obj, pak_id, disp_name, (False, ind))
             if obj_id in all_obj[comp_type]:
                 if allow_dupes:
                     # Pretend this is an override
-                    obj_override[comp_type][obj_id].append(
-                        ParseData(zip_file, obj_id, obj, pak_id)
-                    )
+                    obj_override[comp_type][obj_id].append(obj_data)
                 else:
                     raise Exception('ERROR! "' + obj_id + '" defined twice!')
             objects += 1
-            all_obj[comp_type][obj_id] = ObjData(
-                zip_file,
-                obj,
-                pak_id,
-                disp_name,
-            )
+            all_obj[comp_type][obj_id] = obj_data
+    return objects
 
-    img_count = 0
-    img_loc = os.path.join('resources', 'bee2')
-    for item in zip_names(zip_file):
-        item = os.path.normcase(item).casefold()
-        if item.startswith("resources"):
-            extract_packages.res_count += 1
-            if item.startswith(img_loc):
-                img_count += 1
-    return objects, img_count
+
+def parse_pak_objects(zip_file, info, pak_id):
+    """Parse all the objects and overrides defined in a package.
+
+    This returns a dict mapping (obj_type, ObjData.key) to the objects.
+    """
+    pak_objects = {}
+    for comp_type, obj_type in OBJ_TYPES.items():
+        for is_override, blocks in [
+                (True, info.find_all("Overrides", comp_type)),
+                (False, info.find_all(comp_type)),
+                ]:
+            for ind, obj in enumerate(blocks):
+                obj_id = obj['id']
+                # parse through the object and return the resultant class
+                try:
+                    pak_objects[comp_type, (is_override, ind)] = (
+                        obj_type.cls.parse(
+                            ParseData(zip_file, obj_id, obj, pak_id)
+                        )
+                    )
+                except (NoKeyError, IndexError) as e:
+                    reraise_keyerror(e, obj_id)
+    return pak_objects
+
+
+def count_resources(index):
+    """Count the resources in a package, using its index.
+
+    This returns the total number of resources, and the number of images.
+    """
+    resources = 0
+    images = 0
+    for pak_file in index.values():
+        if pak_file.is_resource:
+            resources += 1
+            if pak_file.is_image:
+                images += 1
+    return resources, images
 
 
 def setup_style_tree(item_data, style_data, log_fallbacks, log_missing_styles):
@@ -408,20 +602,80 @@ def setup_style_tree(item_data, style_data, log_fallbacks, log_missing_styles):
                         vers['styles'][sty_id] = item.def_ver['styles'][sty_id]
 
 
+class ItemFolder(dict):
+    """The data for one of an item's folders.
+
+    The editoritems and vbsp_config trees are large, and are only needed
+    to export. These are only parsed when the 'editor', 'editor_extra' or
+    'vbsp' keys are first accessed - 'meta' has the ItemMeta summary the
+    UI uses instead.
+    """
+    def __init__(self, pak_id, fold, values):
+        super().__init__(values)
+        self.pak_id = pak_id
+        self.fold = fold
+        # The (pak_id, folder) for each vbsp_config to combine.
+        # Overrides add their own to this.
+        self.vbsp_sources = [(pak_id, fold)]
+
+    def __missing__(self, key):
+        if key == 'editor' or key == 'editor_extra':
+            editor = read_package_file(
+                self.pak_id,
+                'items/' + self.fold + '/editoritems.txt',
+            )
+            editor_iter = Property.find_all(editor, 'Item')
+            # The first Item block found
+            self['editor'] = next(editor_iter)
+            # Any extra blocks (offset catchers, extent items)
+            self['editor_extra'] = list(editor_iter)
+        elif key == 'vbsp':
+            vbsp = Property(None, [])
+            for pak_id, fold in self.vbsp_sources:
+                try:
+                    vbsp += read_package_file(
+                        pak_id,
+                        'items/' + fold + '/vbsp_config.cfg',
+                    )
+                except KeyError:
+                    pass
+            self['vbsp'] = vbsp
+        else:
+            raise KeyError(key)
+        return self[key]
+
+    def add_vbsp(self, other: 'ItemFolder'):
+        """Add the vbsp_config commands from another folder to ours."""
+        if 'vbsp' in self or 'vbsp' in other:
+            # Already parsed, just combine them.
+            self['vbsp'] += other['vbsp']
+        else:
+            self.vbsp_sources.extend(other.vbsp_sources)
+
+
+def read_package_file(pak_id, path):
+    """Parse a keyvalues file in a package, after loading has finished.
+
+    The package is reopened if needed, and kept open for later files.
+    """
+    try:
+        zip_file = lazy_zips[pak_id]
+    except KeyError:
+        zip_file = lazy_zips[pak_id] = packageWorker.open_package(
+            packages[pak_id].name,
+        )
+    return parse_prop_file(zip_file, path, pak_id)
+
+
 def parse_item_folder(folders, zip_file, pak_id):
     for fold in folders:
         prop_path = 'items/' + fold + '/properties.txt'
         editor_path = 'items/' + fold + '/editoritems.txt'
-        config_path = 'items/' + fold + '/vbsp_config.cfg'
         try:
-            with zip_file.open(prop_path, 'r') as prop_file:
-                props = Property.parse(
-                    prop_file, pak_id + ':' + prop_path,
-                ).find_key('Properties')
-            with zip_file.open(editor_path, 'r') as editor_file:
-                editor = Property.parse(
-                    editor_file, pak_id + ':' + editor_path
-                )
+            props = parse_prop_file(
+                zip_file, prop_path, pak_id,
+            ).find_key('Properties')
+            meta = parse_item_meta(zip_file, editor_path, pak_id)
         except KeyError as err:
             # Opening the files failed!
             raise IOError(
@@ -429,8 +683,7 @@ def parse_item_folder(folders, zip_file, pak_id):
                 'Folder likely missing! '
                 ) from err
 
-        editor_iter = Property.find_all(editor, 'Item')
-        folders[fold] = {
+        folders[fold] = ItemFolder(pak_id, fold, {
             'auth':     sep_values(props['authors', '']),
             'tags':     sep_values(props['tags', '']),
             'desc':     list(desc_parse(props)),
@@ -439,13 +692,8 @@ def parse_item_folder(folders, zip_file, pak_id):
             'icons':    {p.name: p.value for p in props['icon', []]},
             'all_name': props['all_name', None],
             'all_icon': props['all_icon', None],
-            'vbsp':     Property(None, []),
-
-            # The first Item block found
-            'editor': next(editor_iter),
-            # Any extra blocks (offset catchers, extent items)
-            'editor_extra': list(editor_iter),
-        }
+            'meta':     meta,
+        })
 
         if LOG_ENT_COUNT and folders[fold]['ent'] == '??':
             print('Warning: "{}:{}" has missing entity count!'.format(
@@ -466,14 +714,6 @@ def parse_item_folder(folders, zip_file, pak_id):
                     pak_id, prop_path
                 )
             )
-        try:
-            with zip_file.open(config_path, 'r') as vbsp_config:
-                folders[fold]['vbsp'] = Property.parse(
-                    vbsp_config,
-                    pak_id + ':' + config_path,
-                )
-        except KeyError:
-            folders[fold]['vbsp'] = Property(None, [])
 
 
 @pak_object('Style')
@@ -534,18 +774,14 @@ class Style:
             base = None
         folder = 'styles/' + info['folder']
         config = folder + '/vbsp_config.cfg'
-        with data.zip_file.open(folder + '/items.txt', 'r') as item_data:
-            items = Property.parse(
-                item_data,
-                data.pak_id+':'+folder+'/items.txt'
-            )
+        items = parse_prop_file(
+            data.zip_file,
+            folder + '/items.txt',
+            data.pak_id,
+        )
 
         try:
-            with data.zip_file.open(config, 'r') as vbsp_config:
-                vbsp = Property.parse(
-                    vbsp_config,
-                    data.pak_id+':'+config,
-                )
+            vbsp = parse_prop_file(data.zip_file, config, data.pak_id)
         except KeyError:
             vbsp = None
         return cls(
@@ -674,7 +910,7 @@ class Item:
                         our_style['auth'].extend(style['auth'])
                         our_style['desc'].extend(style['desc'])
                         our_style['tags'].extend(style['tags'])
-                        our_style['vbsp'] += style['vbsp']
+                        our_style.add_vbsp(style)
 
     def __repr__(self):
         return '<Item:' + self.id + '>'
@@ -0,0 +1,224 @@
+"""Parses the keyvalues files and extracts resources in worker processes.
+
+This is used by packageLoader to parse packages in parallel, and by
+extract_packages to copy resources. It must not import anything which
+uses Tk, since it is imported by each worker.
+"""
+import os
+import os.path
+from collections import namedtuple
+from fnmatch import fnmatchcase
+from zipfile import ZipFile
+
+from property_parser import Property, KeyValError
+from FakeZip import FakeZip
+
+# The keyvalues files in packages, which can be parsed ahead of time.
+# Item editoritems and vbsp_configs are only fully parsed when used.
+PROP_FILES = [
+    'items/*/properties.txt',
+    'styles/*/items.txt',
+    'styles/*/vbsp_config.cfg',
+    'items/*.cfg',
+    'voice/*.cfg',
+    'skybox/*.cfg',
+]
+# Item editoritems, which are only summarised into an ItemMeta.
+EDITOR_FILES = 'items/*/editoritems.txt'
+
+# The information about an item the UI needs, read from its editoritems.
+# This is small, so it can be cached instead of the whole tree.
+ItemMeta = namedtuple('ItemMeta', [
+    'sub_names',  # Names of the subtypes on the palette
+    'has_inputs',
+    'has_polarity',
+    'has_outputs',
+    'has_timer',
+    'rot_type',  # The MovementHandle, casefolded
+    'surf_wall',  # If the item can be placed on walls, floors, ceilings
+    'surf_floor',
+    'surf_ceil',
+    'is_embed',  # Has EmbeddedVoxels
+    'properties',  # All the property names
+    'prop_defaults',  # Property name -> default value
+])
+
+
+# The number of files extracted before the shared progress count is updated.
+PROGRESS_BATCH = 64
+
+
+# An entry in a package's index.
+# - member is the name to pass to the zip.
+# - crc is the CRC-32 of the file for zips. For folders it's the
+#   modification time instead, since that doesn't need the file read.
+PakFile = namedtuple('PakFile', 'member, size, crc, is_image, is_resource')
+
+
+def norm_path(path):
+    """Convert a path in a package to the form used for lookups."""
+    return path.replace('\\', '/')
+
+
+def index_package(zip_file):
+    """Read through a package once, to find all the files in it.
+
+    This returns a dict mapping the normalised, casefolded path to
+    PakFile tuples.
+    """
+    index = {}
+    if isinstance(zip_file, FakeZip):
+        base = zip_file.folder
+        for dirpath, dirnames, filenames in os.walk(base):
+            for name in filenames:
+                full_path = os.path.join(dirpath, name)
+                stat = os.stat(full_path)
+                index_add(
+                    index,
+                    os.path.relpath(full_path, base),
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                )
+    else:
+        for info in zip_file.infolist():
+            if not info.filename.endswith('/'):  # Skip directories
+                index_add(index, info.filename, info.file_size, info.CRC)
+    return index
+
+
+def index_add(index, member, size, crc):
+    """Add a file to a package index."""
+    path = norm_path(member).casefold()
+    index[path] = PakFile(
+        member,
+        size,
+        crc,
+        path.startswith('resources/bee2/'),
+        path.startswith('resources/'),
+    )
+
+
+def open_package(path):
+    """Open a package, which may be a zip or a folder."""
+    if os.path.isfile(path):
+        return ZipFile(path)
+    else:
+        return FakeZip(path)
+
+
+def _matches(path, pat):
+    """Check if a path matches a pattern, without crossing folders."""
+    return fnmatchcase(path, pat) and path.count('/') == pat.count('/')
+
+
+def read_item_meta(editor):
+    """Summarise an editoritems file into an ItemMeta.
+
+    This uses the first Item block, like ItemFolder['editor'].
+    """
+    item = next(Property.find_all(editor, 'Item'))
+
+    has_inputs = has_polarity = has_outputs = is_embed = False
+    for exp in item.find_all("Exporting"):
+        for block in exp:
+            if block.name == "inputs":
+                for inp in block:
+                    if inp.name == "connection_standard":
+                        has_inputs = True
+                    elif inp.name == "connection_tbeam_polarity":
+                        has_polarity = True
+            elif block.name == "outputs":
+                if "CONNECTION_STANDARD" in block:
+                    has_outputs = True
+            elif block.name == "embeddedvoxels":
+                is_embed = True
+
+    properties = []
+    prop_defaults = {}
+    for part in item.find_all("Properties"):
+        for prop in part:
+            properties.append(prop.name)
+            if prop.name not in prop_defaults:
+                prop_defaults[prop.name] = prop["DefaultValue", '']
+
+    editor_bit = next(item.find_all("Editor"))
+    facing_type = editor_bit["InvalidSurface", ""].casefold()
+
+    return ItemMeta(
+        sub_names=[
+            prop['name', '']
+            for prop in
+            item.find_all("Editor", "Subtype")
+            if prop['Palette', None] is not None
+        ],
+        has_inputs=has_inputs,
+        has_polarity=has_polarity,
+        has_outputs=has_outputs,
+        has_timer="timerdelay" in properties,
+        rot_type=editor_bit["MovementHandle", "HANDLE_NONE"].casefold(),
+        surf_wall="wall" in facing_type,
+        surf_floor="floor" in facing_type,
+        surf_ceil="ceiling" in facing_type,
+        is_embed=is_embed,
+        properties=properties,
+        prop_defaults=prop_defaults,
+    )
+
+
+def parse_package_files(pak_path, pak_id, members):
+    """Parse all the keyvalues files in a package.
+
+    members is the list of files in the package, from index_package().
+    This returns a dict mapping the path to the parsed Property, and
+    a dict mapping editoritems paths to their ItemMeta.
+    Files with syntax errors are skipped, so the error will be raised
+    when the main process parses it again.
+    """
+    parsed = {}
+    metas = {}
+    zip_file = open_package(pak_path)
+    with zip_file:
+        for path in members:
+            path = norm_path(path)
+            if _matches(path, EDITOR_FILES):
+                try:
+                    with zip_file.open(path) as file:
+                        metas[path] = read_item_meta(
+                            Property.parse(file, pak_id + ':' + path)
+                        )
+                except (
+                        KeyValError, KeyError, UnicodeDecodeError,
+                        StopIteration,
+                        ):
+                    pass
+                continue
+            if not any(_matches(path, pat) for pat in PROP_FILES):
+                continue
+            try:
+                with zip_file.open(path) as file:
+                    parsed[path] = Property.parse(file, pak_id + ':' + path)
+            except (KeyValError, KeyError, UnicodeDecodeError):
+                pass
+    return parsed, metas
+
+
+def extract_resources(job_queue, done_files, cache_path):
+    """Extract files from packages, until None is read from the queue.
+
+    Each job is a (package path, member list) tuple. done_files is
+    a multiprocessing.Value, incremented every PROGRESS_BATCH files.
+    """
+    for job in iter(job_queue.get, None):
+        pak_path, members = job
+        count = 0
+        zip_file = open_package(pak_path)
+        with zip_file:
+            for member in members:
+                zip_file.extract(member, path=cache_path)
+                count += 1
+                if count == PROGRESS_BATCH:
+                    with done_files.get_lock():
+                        done_files.value += count
+                    count = 0
+        with done_files.get_lock():
+            done_files.value += count
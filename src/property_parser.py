@@ -5,6 +5,8 @@
 # - Comments on bracketed lines should be separated into their own
 #   comment properties.
 
+import io
+
 import utils
 
 __all__ = ['KeyValError', 'NoKeyError', 'Property', 'INVALID']
@@ -20,6 +22,17 @@ REPLACE_CHARS = {
 # Sentinel value to indicate that no default was given to find_key()
 _NO_KEY_FOUND = object()
 
+# The number of lines export_to() collects before writing them.
+EXPORT_BUFFER_LINES = 1024
+
+# Blocks with at least this many children build an index of their names
+# the first time they're searched, instead of scanning every child.
+INDEX_MIN_CHILDREN = 16
+
+# Incremented whenever an existing Property is renamed, since that makes
+# the indexes of its parent out of date.
+_rename_count = 0
+
 
 class KeyValError(Exception):
     """An error that occured when parsing a Valve KeyValues file.
@@ -83,25 +96,47 @@ class Property:
     Root objects export each child at the topmost indent level.
         This is produced from Property.parse() calls.
 
+    Large blocks keep an index of their children's names, which is
+    updated by append() and reset when .value is read or assigned, or any
+    Property is renamed. Don't keep the .value list around and modify it
+    between lookups - read .value again each time instead.
+
     :type value: list | str
     :type name: str | None
     :type _folded_name: str | None
     :type real_name: str | None
+    :type _index: (int, int, dict) | None
     """
     # Helps decrease memory footprint with lots of Property values.
-    __slots__ = ('_folded_name', 'real_name', 'value')
+    __slots__ = ('_folded_name', 'real_name', '_value', '_index')
 
     def __init__(self, name, value=''):
         """Create a new property instance.
 
         """
         self.real_name = name
-        self.value = value
+        self._value = value
+        self._index = None
         self._folded_name = (
             None if name is None
             else name.casefold()
         )
 
+    @property
+    def value(self):
+        """The value of this Property, either a string or list of children.
+
+        The children list may be modified by the caller, so this resets
+        the name index.
+        """
+        self._index = None
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+        self._index = None
+
     @property
     def name(self):
         """Name automatically casefolds() any given names.
@@ -113,6 +148,8 @@ class Property:
 
     @name.setter
     def name(self, new_name):
+        global _rename_count
+        _rename_count += 1
         self.real_name = new_name
         if new_name is None:
             self._folded_name = None
@@ -121,7 +158,9 @@ class Property:
 
     def edit(self, name=None, value=None):
         """Simultaneously modify the name and value."""
+        global _rename_count
         if name is not None:
+            _rename_count += 1
             self.real_name = name
             self._folded_name = name.casefold()
         if value is not None:
@@ -136,7 +175,7 @@ class Property:
         """
         open_properties = [Property(None, [])]
         for line_num, line in enumerate(file_contents, start=1):
-            values = open_properties[-1].value
+            values = open_properties[-1]._value
             freshline = utils.clean_line(line)
             if not freshline:
                 # Skip blank lines!
@@ -225,6 +264,42 @@ class Property:
                 else:
                     yield prop
 
+    def _build_index(self):
+        """Record the position of the last child with each name."""
+        children = self._value
+        self._index = index = (
+            len(children),
+            _rename_count,
+            {prop._folded_name: pos for pos, prop in enumerate(children)},
+        )
+        return index
+
+    def _find_pos(self, key):
+        """Find the position of the last child with the given folded name.
+
+        None is returned if no child has that name.
+        """
+        children = self._value
+        if len(children) >= INDEX_MIN_CHILDREN:
+            index = self._index
+            if (
+                    index is None or
+                    index[0] != len(children) or
+                    index[1] != _rename_count
+                    ):
+                index = self._build_index()
+            pos = index[2].get(key)
+            if pos is None or children[pos]._folded_name == key:
+                return pos
+            # The children were changed, check them directly and
+            # rebuild next time.
+            self._index = None
+
+        for pos in range(len(children) - 1, -1, -1):
+            if children[pos]._folded_name == key:
+                return pos
+        return None
+
     def find_key(self, key, def_=_NO_KEY_FOUND) -> 'Property':
         """Obtain the value of the child Property with a given name.
 
@@ -233,9 +308,9 @@ class Property:
         - This prefers keys located closer to the end of the value list.
         """
         key = key.casefold()
-        for prop in reversed(self.value):
-            if prop.name == key:
-                return prop
+        pos = self._find_pos(key)
+        if pos is not None:
+            return self._value[pos]
         if def_ is _NO_KEY_FOUND:
             raise NoKeyError(key)
         else:
@@ -254,9 +329,13 @@ class Property:
             # Search through each item in the tree!
             for key in path[:-1]:
                 folded_key = key.casefold()
-                # We can't use find_key() here because we also
+                # We can't just use find_key() here because we also
                 # need to check that the property has chilren to search
                 # through
+                pos = self._find_pos(folded_key)
+                if pos is not None and self._value[pos].has_children():
+                    current_prop = self._value[pos]
+                    continue
                 for prop in reversed(self.value):
                     if (prop.name is not None and
                             prop.name == folded_key and
@@ -352,7 +431,7 @@ class Property:
         Singluar Properties have a length of 1.
         """
         if self.has_children():
-            return len(self.value)
+            return len(self._value)
         else:
             return 1
 
@@ -361,9 +440,9 @@ class Property:
 
         """
         if self.has_children():
-            return iter(self.value)
+            return iter(self._value)
         else:
-            return iter((self.value,))
+            return iter((self._value,))
 
     def __contains__(self, key):
         """Check to see if a name is present in the children.
@@ -372,10 +451,7 @@ class Property:
         """
         key = key.casefold()
         if self.has_children():
-            for prop in self.value:
-                if prop.name == key:
-                    return True
-            return False
+            return self._find_pos(key) is not None
         else:
             return self.name == key
 
@@ -390,7 +466,7 @@ class Property:
         """
         if self.has_children():
             if isinstance(index, int) or isinstance(index, slice):
-                return self.value[index]
+                return self._value[index]
             else:
                 if isinstance(index, tuple):
                     # With default value
@@ -417,7 +493,8 @@ class Property:
         """
         if self.has_children():
             if isinstance(index, int) or isinstance(index, slice):
-                self.value[index] = value
+                self._value[index] = value
+                self._index = None
             else:
                 self.set_key(index, value)
         elif index == 0:
@@ -436,12 +513,14 @@ class Property:
         """
         if self.has_children():
             if isinstance(index, int):
-                del self.value[index]
+                del self._value[index]
             else:
-                try:
-                    self.value.remove(self.find_key(index))
-                except NoKeyError as no_key:
+                pos = self._find_pos(index.casefold())
+                if pos is None:
+                    no_key = NoKeyError(index.casefold())
                     raise IndexError(no_key) from no_key
+                del self._value[pos]
+            self._index = None
         else:
             self.value = ''
 
@@ -472,13 +551,22 @@ class Property:
         This is the += op, where it does not copy the object.
         """
         if self.has_children():
+            children = self._value
+            start = len(children)
             if isinstance(other, Property):
                 if other.name is None:
-                    self.value.extend(other.value)
+                    children.extend(other.value)
                 else:
-                    self.value.append(other)
+                    children.append(other)
             else:
-                self.value += other
+                children.extend(other)
+            index = self._index
+            if index is not None and index[0] == start:
+                # Add the new children to the index.
+                names = index[2]
+                for pos in range(start, len(children)):
+                    names[children[pos]._folded_name] = pos
+                self._index = (len(children), index[1], names)
             return self
         else:
             return NotImplemented
@@ -492,7 +580,7 @@ class Property:
         After execution, this tree will have only one sub-Property for
         each of the given names. This ignores leaf Properties.
         """
-        folded_names = [name.casefold() for name in names]
+        folded_names = {name.casefold() for name in names}
         new_list = []
         merge = {
             name.casefold(): Property(name, [])
@@ -519,13 +607,15 @@ class Property:
 
     def has_children(self):
         """Does this have child properties?"""
-        return isinstance(self.value, list)
+        return isinstance(self._value, list)
 
     def __repr__(self):
         return 'Property(' + repr(self.name) + ', ' + repr(self.value) + ')'
 
     def __str__(self):
-        return ''.join(self.export())
+        buffer = io.StringIO()
+        self.export_to(buffer)
+        return buffer.getvalue()
 
     def export(self):
         """Generate the set of strings for a property file.
@@ -555,3 +645,48 @@ class Property:
                 yield '\t}\n'
         else:
             yield out_val + ' "' + str(self.value) + '"\n'
+
+    def export_to(self, file, indent=''):
+        """Write the property file text to a file.
+
+        This produces the same text as export(), with indent added to the
+        start of each line. The tree is walked without recursion, and
+        lines are written in large chunks.
+        """
+        # indents[depth] is the prefix for lines at that depth.
+        indents = [indent]
+        buffer = []
+        # Each entry is an iterator over the remaining Properties, their
+        # depth, and whether a closing brace is needed when it's done.
+        if isinstance(self._value, list) and self.name is None:
+            stack = [(iter(self._value), 0, False)]
+        else:
+            stack = [(iter((self,)), 0, False)]
+
+        while stack:
+            props, depth, close = stack[-1]
+            ind = indents[depth]
+            for prop in props:
+                if isinstance(prop._value, list):
+                    if prop.name is None:
+                        # Roots just output their children.
+                        stack.append((iter(prop._value), depth, False))
+                    else:
+                        buffer.append(ind + '"' + str(prop.real_name) + '"\n')
+                        buffer.append(ind + '\t{\n')
+                        if len(indents) == depth + 1:
+                            indents.append(ind + '\t')
+                        stack.append((iter(prop._value), depth + 1, True))
+                    break
+                buffer.append(
+                    ind + '"' + str(prop.real_name) + '" "' +
+                    str(prop._value) + '"\n'
+                )
+                if len(buffer) >= EXPORT_BUFFER_LINES:
+                    file.write(''.join(buffer))
+                    buffer.clear()
+            else:
+                stack.pop()
+                if close:
+                    buffer.append(ind + '}\n')
+        file.write(''.join(buffer))
@@ -0,0 +1,113 @@
+"""Copies resources into the game, using links where possible.
+
+Copy-on-write clones (reflinks) and hardlinks cost almost no I/O compared
+to copying. If a method doesn't work on these filesystems, the next one
+is used instead.
+"""
+import errno
+import os
+import shutil
+import time
+from collections import Counter
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# The ioctl to clone a file on Linux (btrfs, XFS...).
+FICLONE = 0x40049409
+
+# The methods to try for each option, in order.
+# Symlinks are only used if requested, since the game breaks if the
+# cache is removed.
+METHODS = {
+    'auto': ['reflink', 'hardlink', 'copy'],
+    'reflink': ['reflink', 'copy'],
+    'hardlink': ['hardlink', 'copy'],
+    'symlink': ['symlink', 'copy'],
+    'copy': ['copy'],
+}
+
+# These errors mean a method can't be used with these folders at all.
+# Others (like EPERM from protected hardlinks) only affect that file, so
+# the next method is used just for it.
+UNSUPPORTED_ERRORS = {
+    errno.EXDEV,  # Different filesystems
+    errno.EINVAL,  # Reflinks on filesystems without them
+    errno.ENOTTY,
+    errno.EOPNOTSUPP,
+    errno.ENOSYS,
+}
+
+
+def reflink(src, dest):
+    """Clone a file, sharing the data until either is modified."""
+    if fcntl is None:
+        raise OSError(errno.ENOSYS, 'Reflinks are not supported')
+    with open(src, 'rb') as src_file, open(dest, 'wb') as dest_file:
+        fcntl.ioctl(dest_file.fileno(), FICLONE, src_file.fileno())
+    shutil.copystat(src, dest)
+
+
+def hardlink(src, dest):
+    os.link(src, dest)
+
+
+def symlink(src, dest):
+    os.symlink(os.path.abspath(src), dest)
+
+
+DEPLOY_FUNCS = {
+    'reflink': reflink,
+    'hardlink': hardlink,
+    'symlink': symlink,
+    'copy': shutil.copy2,
+}
+
+
+class Deployer:
+    """Places files into the game, using the first method which works.
+
+    Hardlinked files share their data with the cache, so existing
+    destination files are always removed first instead of overwritten.
+    """
+    def __init__(self, mode='auto'):
+        self.methods = list(METHODS.get(mode, METHODS['auto']))
+        self.counts = Counter()
+        self.times = Counter()
+
+    def deploy(self, src, dest):
+        """Copy src to dest, and return the method used."""
+        try:
+            os.remove(dest)
+        except FileNotFoundError:
+            pass
+        for method in list(self.methods):
+            start = time.perf_counter()
+            try:
+                DEPLOY_FUNCS[method](src, dest)
+            except OSError as e:
+                if method == 'copy':
+                    raise
+                # Remove any partial file before trying the next method.
+                try:
+                    os.remove(dest)
+                except FileNotFoundError:
+                    pass
+                if e.errno in UNSUPPORTED_ERRORS:
+                    print('Cannot use {} for resources: {}'.format(method, e))
+                    self.methods.remove(method)
+                continue
+            self.counts[method] += 1
+            self.times[method] += time.perf_counter() - start
+            return method
+
+    def summary(self):
+        """Print how many files were deployed with each method."""
+        for method, count in self.counts.most_common():
+            print(' - {}: {} files in {:.2f}s'.format(
+                method,
+                count,
+                self.times[method],
+            ))
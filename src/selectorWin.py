@@ -19,9 +19,13 @@ import utils
 ICON_SIZE = 96  # Size of the selector win icons
 ITEM_WIDTH = ICON_SIZE + (32 if utils.MAC else 16)
 ITEM_HEIGHT = ICON_SIZE + 51
+# Milliseconds to wait after the window is resized before moving items.
+FLOW_DELAY = 50
 
 # The larger error icon used if an image is not found
 err_icon = img.png('BEE2/error_96', resize_to=ICON_SIZE)
+# Shown while item icons are loaded in the background
+blank_icon = img.png('BEE2/blank_96', resize_to=ICON_SIZE)
 
 # The two icons used for boolean item attributes
 ICON_CHECK = img.png('icons/check')
@@ -58,7 +62,7 @@ class Item:
     - group: Items with the same group name will be shown together.
     - attrs: a dictionary containing the attribute values for this item.
 
-    - button, win: Set later, the button and window TK objects for this item
+    - button, win: Set later, the button and selWin for this item
     """
     __slots__ = [
         'name',
@@ -95,17 +99,15 @@ class Item:
         else:
             self.context_lbl = self.longName
         if icon is None:
-            self.icon = img.png(
-                'BEE2/blank_96',
-                error=err_icon,
-                resize_to=ICON_SIZE,
-            )
+            self.icon = blank_icon
             self.ico_file = 'BEE2/blank_96'
         else:
-            self.icon = img.png(
+            self.icon = img.png_async(
                 icon,
+                self._set_icon,
                 error=err_icon,
                 resize_to=ICON_SIZE,
+                placeholder=blank_icon,
             )
             self.ico_file = icon
         self.desc = desc
@@ -130,6 +132,14 @@ class Item:
     def __str__(self):
         return '<Item:' + self.name + '>'
 
+    def _set_icon(self, icon):
+        """Show the icon, once it's been loaded in the background."""
+        self.icon = icon
+        if self.button is not None:
+            self.button['image'] = icon
+        if self.win is not None and self.win.selected is self:
+            self.win.prop_icon['image'] = icon
+
     @classmethod
     def from_data(cls, obj_id, data: SelitemData, attrs=None):
         """Create a selector Item from a SelitemData tuple."""
@@ -407,6 +417,19 @@ class selWin:
             key=lambda it: 2 if it.group else 1
         )
 
+        # Item -> position in item_list (and the context menu).
+        self.item_index = {
+            item: ind
+            for ind, item in
+            enumerate(self.item_list)
+        }
+        # Item ID -> Item, for everything but the <none> item.
+        self.item_by_id = {
+            item.name: item
+            for item in self.item_list
+            if item is not self.noneItem
+        }
+
         for ind, item in enumerate(self.item_list):
             if item == self.noneItem:
                 item.button = ttk.Button(
@@ -421,6 +444,7 @@ class selWin:
                     image=item.icon,
                     compound='top',
                     )
+            item.win = self
             self.context_menu.add_radiobutton(
                 label=item.context_lbl,
                 command=functools.partial(self.sel_item_id, item.name),
@@ -437,8 +461,11 @@ class selWin:
                 item.button,
                 self.save,
             )
+        # The number of columns the items were last placed in.
+        self.flow_width = None
+        self._flow_after = None
         self.flow_items(None)
-        self.wid_canvas.bind("<Configure>", self.flow_items)
+        self.wid_canvas.bind("<Configure>", self.on_resize)
 
         self.pane_win.add(shim)
         self.pane_win.add(self.prop_frm)
@@ -576,7 +603,7 @@ class selWin:
             self.disp_label.set(self.selected.context_lbl)
             self.chosen_id = self.selected.name
         self.orig_selected = self.selected
-        self.context_var.set(self.item_list.index(self.selected))
+        self.context_var.set(self.item_index[self.selected])
         return "break"  # stop the entry widget from continuing with this event
 
     def rollover_suggest(self):
@@ -627,13 +654,14 @@ class selWin:
             self.do_callback()
             return True
         else:
-            for item in self.item_list:
-                if item.name == it_id:
-                    self.sel_item(item)
-                    self.set_disp()
-                    self.do_callback()
-                    return True
-            return False
+            try:
+                item = self.item_by_id[it_id]
+            except KeyError:
+                return False
+            self.sel_item(item)
+            self.set_disp()
+            self.do_callback()
+            return True
 
     def sel_item(self, item: Item, _=None):
         self.prop_name['text'] = item.longName
@@ -675,50 +703,66 @@ class selWin:
                     label['text'] = val
 
 
+    def on_resize(self, _=None):
+        """Reflow the items once the window stops being resized.
+
+        Called on the <Configure> event.
+        """
+        if self._flow_after is not None:
+            self.win.after_cancel(self._flow_after)
+        self._flow_after = self.win.after(FLOW_DELAY, self.flow_items)
+
     def flow_items(self, _=None):
         """Reposition all the items to fit in the current geometry.
 
-        Called on the <Configure> event.
+        The buttons are only moved if the number of columns changed.
         """
+        if self._flow_after is not None:
+            self.win.after_cancel(self._flow_after)
+            self._flow_after = None
         self.pal_frame.update_idletasks()
         self.pal_frame['width'] = self.wid_canvas.winfo_width()
         self.prop_name['wraplength'] = self.prop_desc.winfo_width()
         width = (self.wid_canvas.winfo_width() - 10) // ITEM_WIDTH
         if width < 1:
             width = 1  # we got way too small, prevent division by zero
-        num_items = len(self.item_list)
-        self.wid_canvas['scrollregion'] = (
-            0, 0,
-            width*ITEM_WIDTH,
-            math.ceil(num_items/width) * ITEM_HEIGHT+20
-        )
-        self.pal_frame['height'] = (
-            math.ceil(num_items/width) * ITEM_HEIGHT+20
-        )
-        for i, item in enumerate(self.item_list):
-            if item == self.suggested:
-                self.sugg_lbl.place(
+
+        if width != self.flow_width:
+            self.flow_width = width
+            num_items = len(self.item_list)
+            self.wid_canvas['scrollregion'] = (
+                0, 0,
+                width*ITEM_WIDTH,
+                math.ceil(num_items/width) * ITEM_HEIGHT+20
+            )
+            self.pal_frame['height'] = (
+                math.ceil(num_items/width) * ITEM_HEIGHT+20
+            )
+            for i, item in enumerate(self.item_list):
+                item.button.place(
                     x=((i % width) * ITEM_WIDTH + 1),
-                    y=((i // width) * ITEM_HEIGHT)
+                    y=((i // width) * ITEM_HEIGHT + 20)
                 )
-                self.sugg_lbl['width'] = item.button.winfo_width()
-            item.button.place(
+                item.button.lift()
+
+        if self.suggested is not None:
+            i = self.item_index[self.suggested]
+            self.sugg_lbl.place(
                 x=((i % width) * ITEM_WIDTH + 1),
-                y=((i // width) * ITEM_HEIGHT + 20)
+                y=((i // width) * ITEM_HEIGHT)
             )
-            item.button.lift()
+            self.sugg_lbl['width'] = self.suggested.button.winfo_width()
+        else:
+            self.sugg_lbl.place_forget()
 
     def __contains__(self, obj):
         """Determine if the given SelWinItem or item ID is in this item list."""
         if obj == '<None>':
-            return self.noneItem in self.item_list
+            return self.noneItem in self.item_index
         elif isinstance(obj, Item):
-            return obj in self.item_list
+            return obj in self.item_index
         else:
-            for item in self.item_list:
-                if item.name == obj:
-                    return True
-            return False
+            return obj in self.item_by_id
 
     def is_suggested(self):
         """Return whether the current item is the suggested one."""
@@ -732,7 +776,7 @@ class selWin:
         """
         if self.suggested is not None:
             self.context_menu.entryconfig(
-                self.item_list.index(self.suggested),
+                self.item_index[self.suggested],
                 font=self.norm_font)
             # Remove the font from the last suggested item
 
@@ -741,16 +785,12 @@ class selWin:
         elif suggested == "<NONE>":
             self.suggested = self.noneItem
         else:
-            for item in self.item_list:
-                if item.name == suggested:
-                    self.suggested = item
-                    break
-            else:  # Not found
-                self.suggested = None
+            # None if not found
+            self.suggested = self.item_by_id.get(suggested)
 
         if self.suggested is not None:
             self.context_menu.entryconfig(
-                self.item_list.index(self.suggested),
+                self.item_index[self.suggested],
                 font=self.sugg_font)
         self.set_disp()  # Update the textbox if needed
         self.flow_items()  # Refresh
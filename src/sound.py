@@ -3,52 +3,134 @@ This module provides a wrapper around PyGame, in order to play sounds easily.
 To use, call sound.fx() with one of the dict keys.
 If PyGame fails to load, all fx() calls will fail silently.
 (Sounds are not critical to the app, so they just won't play.)
+
+PyGame is slow to start, so the mixer is only initialised and the sounds
+decoded when load() is called, or the first sound is played. This happens
+in a background thread - sounds are skipped until they're ready.
 """
+import importlib.util
+import threading
+
 play_sound = True
 
-try:
-    import pygame
-    # buffer must be power of 2, higher means less choppy audio but
-    # higher latency between play() and the sound actually playing.
-    pygame.mixer.init(frequency=22050, size=-16, channels=2, buffer=1024)
-except ImportError:
-    print('ERROR:SOUNDS NOT INITIALISED!')
+SOUND_DIR = '../sounds/'
+
+SOUNDS = {
+    'select': 'rollover',
+    'add': 'increment',
+    'config': 'reconfig',
+    'subtract': 'decrement',
+    'connect': 'connection_made',
+    'disconnect': 'connection_destroyed',
+    'expand': 'extrude',
+    'delete': 'collapse',
+    'error': 'error',
+    'contract': 'carve',
+    'raise_1': 'panel_raise_01',
+    'raise_2': 'panel_raise_02',
+    'raise_3': 'panel_raise_03',
+    'lower_1': 'panel_lower_01',
+    'lower_2': 'panel_lower_02',
+    'lower_3': 'panel_lower_03',
+    'move': 'reconfig',
+    'swap': 'extrude',
+}
+
+# The loaded sounds, filled in by the loading thread.
+sounds = {}
+_load_thread = None
+
+
+class PygameBackend:
+    """Plays sounds using pygame.mixer."""
+    def __init__(self):
+        import pygame
+        # buffer must be power of 2, higher means less choppy audio but
+        # higher latency between play() and the sound actually playing.
+        pygame.mixer.init(frequency=22050, size=-16, channels=2, buffer=1024)
+        self.mixer = pygame.mixer
+
+    def load(self, filename):
+        """Decode a sound file, returning an object with a play() method."""
+        return self.mixer.Sound(filename)
+
+
+class StubSound:
+    """A sound from StubBackend."""
+    def __init__(self, backend, filename):
+        self.backend = backend
+        self.filename = filename
+
+    def play(self):
+        self.backend.played.append(self.filename)
+
 
-    def fx(*args):
-        """Pygame has failed to initialise!
+class StubBackend:
+    """Doesn't play anything, but records the sounds which would be.
 
-        No sounds will be played.
-        """
-    initiallised = False
-    pygame = None
+    Set backend_type to this to run without audio.
+    """
+    def __init__(self):
+        self.played = []
+
+    def load(self, filename):
+        return StubSound(self, filename)
+
+
+# Importing pygame is slow, so only check that it's installed here.
+if importlib.util.find_spec('pygame') is None:
+    print('ERROR:SOUNDS NOT INITIALISED!')
+    backend_type = None
 else:
-    # Succeeded
-    initiallised = True
-    sounds = {
-        'select': 'rollover',
-        'add': 'increment',
-        'config': 'reconfig',
-        'subtract': 'decrement',
-        'connect': 'connection_made',
-        'disconnect': 'connection_destroyed',
-        'expand': 'extrude',
-        'delete': 'collapse',
-        'error': 'error',
-        'contract': 'carve',
-        'raise_1': 'panel_raise_01',
-        'raise_2': 'panel_raise_02',
-        'raise_3': 'panel_raise_03',
-        'lower_1': 'panel_lower_01',
-        'lower_2': 'panel_lower_02',
-        'lower_3': 'panel_lower_03',
-        'move': 'reconfig',
-        'swap': 'extrude',
-        }
-
-    for key in sounds:
-        sounds[key] = pygame.mixer.Sound('../sounds/' + sounds[key] + '.wav')
-
-    def fx(name, e=None):
-        """Play a sound effect stored in the sounds{} dict."""
-        if play_sound and name in sounds:
-            sounds[name].play()
+    backend_type = PygameBackend
+initiallised = backend_type is not None
+# The backend being used, once the sounds are loaded.
+backend = None
+
+
+def load():
+    """Start loading the sounds in the background, if not already done."""
+    global _load_thread
+    if _load_thread is not None or backend_type is None:
+        return
+    _load_thread = threading.Thread(
+        target=_load_sounds,
+        name='sound_load',
+        daemon=True,
+    )
+    _load_thread.start()
+
+
+def _load_sounds():
+    """Initialise the backend, and decode all the sounds."""
+    global backend
+    try:
+        new_backend = backend_type()
+        decoded = {}
+        loaded = {}
+        for name, file in SOUNDS.items():
+            # Some sounds are used more than once.
+            if file not in decoded:
+                decoded[file] = new_backend.load(SOUND_DIR + file + '.wav')
+            loaded[name] = decoded[file]
+    except Exception as e:
+        print('ERROR: Could not load sounds: {!r}'.format(e))
+        return
+    backend = new_backend
+    sounds.update(loaded)
+
+
+def fx(name, e=None):
+    """Play a sound effect stored in the sounds{} dict.
+
+    If the sounds haven't loaded yet, this starts loading them and
+    skips the sound.
+    """
+    if not play_sound:
+        return
+    try:
+        sound = sounds[name]
+    except KeyError:
+        load()
+    else:
+        sound.play()
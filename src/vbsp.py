@@ -1,7 +1,6 @@
 import os
 import os.path
 import sys
-import subprocess
 import shutil
 import random
 from enum import Enum
@@ -16,6 +15,7 @@ import utils
 import voiceLine
 import instanceLocs
 import conditions
+import hook_runner
 
 # Configuration data extracted from VBSP_config
 settings = {
@@ -2118,8 +2118,7 @@ def make_vrad_config():
     )
 
     with open('bee2/vrad_config.cfg', 'w') as f:
-        for line in conf.export():
-            f.write(line)
+        conf.export_to(f)
 
 
 def save(path):
@@ -2143,36 +2142,7 @@ def run_vbsp(vbsp_args, do_swap, path, new_path):
                 path.replace(".vmf", ".log"),
                 new_path.replace(".vmf", ".log"),
             )
-    # Put quotes around args which contain spaces, and remove blank args.
-    vbsp_args = [('"' + x + '"' if " " in x else x) for x in vbsp_args if x]
-
-    if utils.MAC:
-        os_suff = '_osx'
-    elif utils.LINUX:
-        os_suff = '_linux'
-    else:
-        os_suff = ''
-
-    arg = (
-        '"' +
-        os.path.normpath(
-            os.path.join(
-                os.getcwd(),
-                "vbsp" + os_suff + "_original"
-                )
-            ) +
-        '" ' +
-        " ".join(vbsp_args)
-        )
-
-    utils.con_log("Calling original VBSP...")
-    utils.con_log(arg)
-    code = subprocess.call(
-        arg,
-        stdout=None,
-        stderr=subprocess.PIPE,
-        shell=True,
-    )
+    code, _ = hook_runner.run_compiler('vbsp', vbsp_args)
     if code == 0:
         utils.con_log("Done!")
     else:
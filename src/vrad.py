@@ -1,17 +1,22 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from zipfile import ZipFile
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 
 import os
 import os.path
 import stat
+import struct
 import shutil
 import sys
-import subprocess
+import heapq
+import threading
+import time
 
 from property_parser import Property
 from BSP import BSP, BSP_LUMPS
 import utils
+import hook_runner
 
 CONF = Property('Config')
 SCREENSHOT_DIR = os.path.join(
@@ -20,6 +25,17 @@ SCREENSHOT_DIR = os.path.join(
     'puzzles',
     # Then the <random numbers> folder
 )
+# Zip structures, used to splice the packed files into the pakfile.
+ZIP_EOCD = struct.Struct('<4s4H2LH')
+ZIP_EOCD_MAGIC = b'PK\x05\x06'
+ZIP_CENTRAL_DIR = struct.Struct('<4s6H3L5H2L')
+ZIP_CENTRAL_DIR_MAGIC = b'PK\x01\x02'
+
+# The number of old screenshots to delete at once.
+CLEAN_BATCH_SIZE = 250
+# The thread removing old screenshots, if running.
+clean_thread = None
+
 # Locations of resources we need to pack
 RES_ROOT = [
     os.path.join('..', loc)
@@ -28,10 +44,6 @@ RES_ROOT = [
 ]
 
 
-def quote(txt):
-    return '"' + txt + '"'
-
-
 def set_readonly(file):
     """Make the given file read-only."""
     # Get the old flags
@@ -73,7 +85,7 @@ def load_config():
     utils.con_log('Config Loaded!')
 
 
-def pack_file(zipfile, filename):
+def pack_file(zipfile, filename, log):
     """Check multiple locations for a resource file.
     """
     for poss_path in RES_ROOT:
@@ -87,11 +99,18 @@ def pack_file(zipfile, filename):
             )
             break
     else:
-        utils.con_log('"bee2/' + filename + '" not found!')
+        log.append('"bee2/' + filename + '" not found!')
+
 
+def prepare_pack(path, log):
+    """Build a zip holding the custom content we want to pack.
 
-def pack_content(path):
-    """Pack any custom content into the map."""
+    This only depends on the filelist VBSP wrote, not VRAD's output -
+    so it can run in a background thread while VRAD is lighting the map.
+    Messages are added to the log list instead of printed, so they don't
+    get mixed into VRAD's output.
+    Returns the zip data, or None if there is nothing to pack.
+    """
     files = set()
     try:
         pack_list = open(path[:-4] + '.filelist.txt')
@@ -107,12 +126,102 @@ def pack_content(path):
         files.remove('')
 
     if not files:
-        utils.con_log('No files to pack!')
-        return
+        log.append('No files to pack!')
+        return None
 
-    utils.con_log('Files to pack:')
+    log.append('Files to pack:')
     for file in sorted(files):
-        utils.con_log(' # "' + file + '"')
+        log.append(' # "' + file + '"')
+
+    # Build the entries, and their central directory in memory.
+    zip_data = BytesIO()
+    with ZipFile(zip_data, mode='w') as zipfile:
+        for file in files:
+            pack_file(zipfile, file, log)
+    log.append(' - Pack entries prepared')
+    return zip_data.getvalue()
+
+
+def split_zip(data):
+    """Split zip data into the file entries and the central directory.
+
+    This returns (entries, central directory, entry count). Offsets in the
+    central directory are relative to the start of the entries.
+    """
+    eocd_pos = data.rfind(ZIP_EOCD_MAGIC)
+    if eocd_pos == -1:
+        raise ValueError('Not a zip file!')
+    (
+        _, disk, dir_disk, disk_count, count, dir_size, dir_offset, _,
+    ) = ZIP_EOCD.unpack_from(data, eocd_pos)
+    if disk != 0 or dir_disk != 0 or disk_count != count:
+        raise ValueError('Multi-disk zips are not supported!')
+    if count == 0xFFFF or dir_offset == 0xFFFFFFFF:
+        raise ValueError('ZIP64 files are not supported!')
+    return (
+        data[:dir_offset],
+        data[dir_offset:dir_offset + dir_size],
+        count,
+    )
+
+
+def shift_central_dir(central_dir, offset):
+    """Move the local header offsets in a central directory by offset."""
+    central_dir = bytearray(central_dir)
+    pos = 0
+    while pos < len(central_dir):
+        (
+            magic, *_, name_len, extra_len, comment_len,
+            _, _, _, header_offset,
+        ) = ZIP_CENTRAL_DIR.unpack_from(central_dir, pos)
+        if magic != ZIP_CENTRAL_DIR_MAGIC:
+            raise ValueError('Invalid central directory!')
+        if header_offset == 0xFFFFFFFF:
+            raise ValueError('ZIP64 files are not supported!')
+        struct.pack_into(
+            '<L',
+            central_dir,
+            pos + ZIP_CENTRAL_DIR.size - 4,
+            header_offset + offset,
+        )
+        pos += ZIP_CENTRAL_DIR.size + name_len + extra_len + comment_len
+    return bytes(central_dir)
+
+
+def append_packed(pak_data, pack_data):
+    """Append the entries from a zip made by prepare_pack() to a pakfile.
+
+    The entries and central directory built by prepare_pack() are spliced
+    in as-is, so nothing is read, compressed or checksummed again - only
+    the offsets in the central directory are moved.
+    Returns the new zip data.
+    """
+    if not pak_data:
+        return pack_data
+    old_entries, old_dir, old_count = split_zip(pak_data)
+    new_entries, new_dir, new_count = split_zip(pack_data)
+    central_dir = old_dir + shift_central_dir(new_dir, len(old_entries))
+    count = old_count + new_count
+    return b''.join([
+        old_entries,
+        new_entries,
+        central_dir,
+        ZIP_EOCD.pack(
+            ZIP_EOCD_MAGIC, 0, 0, count, count,
+            len(central_dir),
+            len(old_entries) + len(new_entries),
+            0,
+        ),
+    ])
+
+
+def pack_content(path, pack_data):
+    """Pack any custom content into the map.
+
+    pack_data is the result of prepare_pack().
+    """
+    if pack_data is None:
+        return
 
     utils.con_log("Packing Files!")
     bsp_file = BSP(path)
@@ -120,46 +229,123 @@ def pack_content(path):
     bsp_file.read_header()
 
     # Manipulate the zip entirely in memory
-    zip_data = BytesIO()
-    zip_data.write(bsp_file.get_lump(BSP_LUMPS.PAKFILE))
-    zipfile = ZipFile(zip_data, mode='a')
-    utils.con_log(' - Existing zip read')
-
-    for file in files:
-        pack_file(zipfile, file)
-
+    zip_data = append_packed(
+        bsp_file.get_lump(BSP_LUMPS.PAKFILE),
+        pack_data,
+    )
     utils.con_log(' - Added files')
 
-    zipfile.close()  # Finalise the zip modification
-
     # Copy the zipfile into the BSP file, and adjust the headers
     bsp_file.replace_lump(
         path,
         BSP_LUMPS.PAKFILE,
-        zip_data.getvalue(),  # Get the binary data we need
+        zip_data,
     )
     utils.con_log(' - BSP written!')
 
     utils.con_log("Packing complete!")
 
 
+def check_bsp(path):
+    """Log some statistics about the compiled map."""
+    with BSP(path) as bsp_file:
+        bsp_file.read_header()
+        ents = bsp_file.entities
+        utils.con_log('Map has {} entities, using {} materials.'.format(
+            len(ents.entities) + 1,  # worldspawn
+            len(set(bsp_file.texdata_strings)),
+        ))
+        utils.con_log('Game lumps: ' + ', '.join(sorted(bsp_file.game_lumps)))
+
+
 def find_screenshots():
     """Find candidate screenshots to overwrite."""
     # Inside SCREENSHOT_DIR, there should be 1 folder with a
     # random name which contains the user's puzzles. Just
     # attempt to modify a screenshot in each of the directories
     # in the folder.
-    for folder in os.listdir(SCREENSHOT_DIR):
-        full_path = os.path.join(SCREENSHOT_DIR, folder)
-        if os.path.isdir(full_path):
-            # The screenshot to modify is untitled.jpg
-            screenshot = os.path.join(full_path, 'untitled.jpg')
-            if os.path.isfile(screenshot):
-                yield screenshot
+    with os.scandir(SCREENSHOT_DIR) as folders:
+        for folder in folders:
+            if folder.is_dir():
+                # The screenshot to modify is untitled.jpg
+                screenshot = os.path.join(folder.path, 'untitled.jpg')
+                if os.path.isfile(screenshot):
+                    yield screenshot
+
+
+def scan_auto_screenshots(auto_path):
+    """Read the automatic screenshot folder in one pass.
+
+    This returns a heap of (-mtime, path) tuples, so the most
+    recent file is first.
+    """
+    screens = []
+    with os.scandir(auto_path) as entries:
+        for entry in entries:
+            try:
+                if not entry.is_file():
+                    continue
+                # On Windows, scandir() caches the stat result.
+                screens.append((-entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                continue
+    heapq.heapify(screens)
+    return screens
+
+
+def clean_screenshots(screens, batch_size=CLEAN_BATCH_SIZE):
+    """Delete the given screenshots, in batches.
+
+    This is run in a background thread, since there could be thousands.
+    """
+    for batch_start in range(0, len(screens), batch_size):
+        removed = 0
+        for screen in screens[batch_start:batch_start + batch_size]:
+            try:
+                os.remove(screen)
+                removed += 1
+            except OSError:
+                pass
+        utils.con_log('Removed {} old screenshots.'.format(removed))
+
+
+def pick_auto_screenshot(screens):
+    """Pick the most recent valid screenshot from scan_auto_screenshots().
+
+    This returns the screenshot, and whether the map was playtested.
+    """
+    now = datetime.now().timestamp()
+    playtested = False
+    # Only pop as many as needed, instead of sorting the whole folder.
+    while screens:
+        neg_mtime, scr_shot = heapq.heappop(screens)
+        utils.con_log(scr_shot)
+        filename = os.path.basename(scr_shot)
+        if filename.startswith('bee2_playtest_flag'):
+            # Previewcomplete is a flag to indicate the map's
+            # been playtested. It must be newer than the screenshot
+            playtested = True
+            continue
+        elif filename.startswith('bee2_screenshot'):
+            continue  # Ignore other screenshots
+
+        # We have a screenshot. Check to see if it's
+        # not too old. (Old is > 2 hours)
+        age = now + neg_mtime
+        if age > 2 * 3600:
+            utils.con_log('Screenshot "{scr}" too old ({diff!s})'.format(
+                scr=scr_shot, diff=timedelta(seconds=age),
+            ))
+            # Everything else is older than this, so stop searching.
+            return None, playtested
+
+        return scr_shot, playtested
+    return None, playtested
 
 
 def mod_screenshots():
     """Modify the map's screenshot."""
+    global clean_thread
     mod_type = CONF['screenshot_type', 'PETI'].lower()
 
     if mod_type == 'cust':
@@ -167,7 +353,6 @@ def mod_screenshots():
         scr_loc = CONF['screenshot', '']
     elif mod_type == 'auto':
         utils.con_log('Using automatic screenshot!')
-        scr_loc = None
         # The automatic screenshots are found at this location:
         auto_path = os.path.join(
             '..',
@@ -177,45 +362,14 @@ def mod_screenshots():
         # We need to find the most recent one. If it's named
         # "previewcomplete", we want to ignore it - it's a flag
         # to indicate the map was playtested correctly.
-        screens = [
-            os.path.join(auto_path, path)
-            for path in
-            os.listdir(auto_path)
-        ]
-        screens.sort(
-            key=os.path.getmtime,
-            reverse=True,
-            # Go from most recent to least
-        )
-        playtested = False
-        for scr_shot in screens:
-            utils.con_log(scr_shot)
-            filename = os.path.basename(scr_shot)
-            if filename.startswith('bee2_playtest_flag'):
-                # Previewcomplete is a flag to indicate the map's
-                # been playtested. It must be newer than the screenshot
-                playtested = True
-                continue
-            elif filename.startswith('bee2_screenshot'):
-                continue # Ignore other screenshots
-
-            # We have a screenshot. Check to see if it's
-            # not too old. (Old is > 2 hours)
-            date = datetime.fromtimestamp(
-                os.path.getmtime(scr_shot)
-            )
-            diff = datetime.now() - date
-            if diff.total_seconds() > 2 * 3600:
-                utils.con_log('Screenshot "{scr}" too old ({diff!s})'.format(
-                    scr=scr_shot, diff=diff
-                ))
-                continue
+        screens = scan_auto_screenshots(auto_path)
+        all_screens = [path for mtime, path in screens]
 
+        scr_loc, playtested = pick_auto_screenshot(screens)
+        if scr_loc is not None:
             # If we got here, it's a good screenshot!
-            utils.con_log('Chosen "{}"'.format(scr_shot))
+            utils.con_log('Chosen "{}"'.format(scr_loc))
             utils.con_log('Map Playtested:', playtested)
-            scr_loc = scr_shot
-            break
         else:
             # If we get to the end, we failed to find an automatic
             # screenshot!
@@ -225,11 +379,16 @@ def mod_screenshots():
         if utils.conv_bool(CONF['clean_screenshots', '0']):
             utils.con_log('Cleaning up screenshots...')
             # Clean up this folder - otherwise users will get thousands of
-            # pics in there!
-            for screen in screens:
-                if screen != scr_loc:
-                    os.remove(screen)
-            utils.con_log('Done!')
+            # pics in there! This is done in the background, while
+            # VRAD runs.
+            clean_thread = threading.Thread(
+                target=clean_screenshots,
+                args=([
+                    screen for screen in all_screens
+                    if screen != scr_loc
+                ],),
+            )
+            clean_thread.start()
     else:
         # PeTI type, or something else
         scr_loc = None
@@ -259,32 +418,7 @@ def mod_screenshots():
 def run_vrad(args):
     "Execute the original VRAD."
 
-    if utils.MAC:
-        os_suff = '_osx'
-    elif utils.LINUX:
-        os_suff = '_linux'
-    else:
-        os_suff = ''
-
-    joined_args = (
-        '"' + os.path.normpath(
-            os.path.join(os.getcwd(), "vrad" + os_suff + "_original")
-            ) +
-        '" ' +
-        " ".join(
-            # put quotes around args which contain spaces
-            (quote(x) if " " in x else x)
-            for x in args
-            )
-        )
-    utils.con_log("Calling original VRAD...")
-    utils.con_log(joined_args)
-    code = subprocess.call(
-        joined_args,
-        stdout=None,
-        stderr=subprocess.PIPE,
-        shell=True,
-    )
+    code, _ = hook_runner.run_compiler('vrad', args)
     if code == 0:
         utils.con_log("Done!")
     else:
@@ -292,6 +426,13 @@ def run_vrad(args):
         sys.exit(code)
 
 
+def timed_call(func, *args):
+    """Call a function, returning the result and the time it took."""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
 def main(argv):
     utils.con_log('BEE2 VRAD hook started!')
     args = " ".join(argv)
@@ -351,17 +492,50 @@ def main(argv):
 
     mod_screenshots()
 
-    if is_peti:
-        utils.con_log("Forcing Cheap Lighting!")
-        run_vrad(fast_args)
-    else:
-        utils.con_log("Hammer map detected! Not forcing cheap lighting..")
-        run_vrad(full_args)
+    do_pack = '-no_pack' not in args
 
-    if '-no_pack' not in args:
-        pack_content(path)
-    else:
-        utils.con_log("No items to pack!")
+    with ThreadPoolExecutor(max_workers=1) as pack_pool:
+        if do_pack:
+            # Gathering the files to pack doesn't need VRAD's output, so
+            # do that while VRAD runs. Only the lump splice waits.
+            pack_log = []
+            pack_future = pack_pool.submit(
+                timed_call, prepare_pack, path, pack_log,
+            )
+
+        vrad_start = time.perf_counter()
+        if is_peti:
+            utils.con_log("Forcing Cheap Lighting!")
+            run_vrad(fast_args)
+        else:
+            utils.con_log("Hammer map detected! Not forcing cheap lighting..")
+            run_vrad(full_args)
+        vrad_end = time.perf_counter()
+
+        if do_pack:
+            pack_data, prep_time = pack_future.result()
+            waited = time.perf_counter() - vrad_end
+            for line in pack_log:
+                utils.con_log(line)
+            utils.con_log(
+                'Pack preparation took {:.2f}s (VRAD: {:.2f}s), '
+                'saved {:.2f}s by overlapping.'.format(
+                    prep_time,
+                    vrad_end - vrad_start,
+                    prep_time - waited,
+                )
+            )
+            pack_content(path, pack_data)
+        else:
+            utils.con_log("No items to pack!")
+    try:
+        check_bsp(path)
+    except Exception as e:
+        # This is only informational, it shouldn't fail the compile.
+        utils.con_log('Could not read map statistics: {!r}'.format(e))
+
+    if clean_thread is not None:
+        clean_thread.join()
     utils.con_log("BEE2 VRAD hook finished!")
 
 if __name__ == '__main__':
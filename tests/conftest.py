@@ -0,0 +1,5 @@
+"""The app's modules import each other as top-level modules from src/."""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
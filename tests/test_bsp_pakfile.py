@@ -0,0 +1,104 @@
+"""Check bsp_pakfile --strip only removes files nothing refers to."""
+import io
+import struct
+from zipfile import ZipFile
+
+import bsp_pakfile
+from BSP import BSP, BSP_LUMPS, LUMP_COUNT
+
+
+def build_bsp(path, pak_files, entities, materials):
+    """Write a minimal Portal 2 BSP with the given pakfile contents."""
+    ent_data = ''.join(
+        '{\n' + ''.join(
+            '"{}" "{}"\n'.format(key, value)
+            for key, value in ent.items()
+        ) + '}\n'
+        for ent in entities
+    ).encode() + b'\0'
+
+    str_data = b''
+    str_table = []
+    for mat in materials:
+        str_table.append(len(str_data))
+        str_data += mat.encode() + b'\0'
+
+    pak_buf = io.BytesIO()
+    with ZipFile(pak_buf, 'w') as pak:
+        for name, data in pak_files.items():
+            pak.writestr(name, data)
+
+    lumps = [
+        (BSP_LUMPS.ENTITIES, ent_data),
+        (BSP_LUMPS.TEXDATA_STRING_DATA, str_data),
+        (
+            BSP_LUMPS.TEXDATA_STRING_TABLE,
+            struct.pack('<{}i'.format(len(str_table)), *str_table),
+        ),
+        (BSP_LUMPS.GAME_LUMP, struct.pack('<i', 0)),
+        (BSP_LUMPS.PAKFILE, pak_buf.getvalue()),
+    ]
+    headers = [(0, 0, 0, b'\0\0\0\0')] * LUMP_COUNT
+    body = b''
+    offset = 8 + 16 * LUMP_COUNT + 4
+    for lump, data in lumps:
+        data += bytes(-len(data) % 4)
+        headers[lump.value] = (offset + len(body), len(data), 0, b'\0\0\0\0')
+        body += data
+
+    with open(path, 'wb') as f:
+        f.write(b'VBSP' + struct.pack('<i', 21))
+        for header in headers:
+            f.write(struct.pack('<3i4s', *header))
+        f.write(struct.pack('<i', 1))  # Map revision
+        f.write(body)
+
+
+def packed_names(path):
+    bsp = BSP(path)
+    bsp.read_header()
+    with bsp.open_lump(BSP_LUMPS.PAKFILE) as lump, ZipFile(lump) as pak:
+        return set(pak.namelist())
+
+
+def test_strip_keeps_files_used_by_particles_and_scripts(tmp_path):
+    """Files only named by particles, scripts or soundscripts are kept."""
+    used_by_others = {
+        # The particle names its material without the folder or extension.
+        'materials/particle/spark.vmt':
+            b'"SpriteCard" { "$basetexture" "particle/spark" }',
+        'materials/particle/spark.vtf': b'vtf',
+        'models/props/scripted.mdl': b'mdl',
+        'models/props/scripted.vvd': b'vvd',
+        'materials/props/scripted_skin.vtf': b'vtf',
+        'materials/vgui/hud_icon.vmt': b'"UnlitGeneric" { }',
+        'materials/decals/sounded.vmt': b'"LightmappedGeneric" { }',
+    }
+    always_kept = {
+        'particles/custom.pcf':
+            b'\0\x01DmeParticleSystemDefinition\0particle\\spark.vmt\0\x02',
+        'scripts/vscripts/spawner.nut':
+            b'self.PrecacheModel("models/props/scripted.mdl")\n',
+        'scripts/game_sounds_custom.txt':
+            b'"custom.sound"\n{\n"wave" "test.wav"\n'
+            b'"decal" "materials/decals/sounded.vmt"\n}\n',
+        'resource/ui/hud.res':
+            b'"hud"\n{\n"image" "vgui/hud_icon"\n}\n',
+        'sound/test.wav': b'RIFF',
+    }
+    unused = {
+        'materials/tile/unused.vmt': b'"LightmappedGeneric" { }',
+        'materials/tile/unused.vtf': b'vtf',
+        'models/props/unused.mdl': b'mdl',
+    }
+    files = dict(used_by_others, **always_kept)
+    files.update(unused)
+    files['models/props/scripted.mdl'] = b'\0props\0scripted_skin\0'
+
+    src = str(tmp_path / 'map.bsp')
+    dest = str(tmp_path / 'stripped.bsp')
+    build_bsp(src, files, [{'classname': 'worldspawn'}], [])
+    bsp_pakfile.main([src, '--quiet', '--strip', '--output', dest])
+
+    remaining = packed_names(dest)
+    assert remaining == set(used_by_others) | set(always_kept)
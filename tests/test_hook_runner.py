@@ -0,0 +1,50 @@
+"""Run hook_runner.run_compiler() on stand-in compilers."""
+import sys
+import threading
+
+import hook_runner
+
+# Writes 1 MB to stderr before any stdout, then some Valve-style output.
+FLOOD_STDERR = '''
+import sys
+for i in range(16 * 1024):
+    sys.stderr.write('warning %05d: '.ljust(63, 'x') % i + '\\n')
+sys.stderr.flush()
+sys.stdout.write('BuildFacelights: 0...1...2...3 (4)\\n')
+sys.stdout.write('(7 seconds elapsed)\\n')
+sys.exit(3)
+'''
+
+
+def run_with_timeout(args, exe, timeout=60):
+    """Call run_compiler() in a thread, failing if it doesn't return."""
+    result = []
+    thread = threading.Thread(
+        target=lambda: result.append(
+            hook_runner.run_compiler('vrad', args, exe=exe)
+        ),
+        daemon=True,
+    )
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), 'run_compiler() deadlocked!'
+    return result[0]
+
+
+def test_flooded_stderr_does_not_deadlock(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    code, phases = run_with_timeout(['-c', FLOOD_STDERR], sys.executable)
+
+    assert code == 3
+    assert phases == [('BuildFacelights', 4), ('Total', 7)]
+
+    log = (tmp_path / hook_runner.OUTPUT_LOG.format('vrad')).read_text()
+    assert '! warning 16383: ' in log
+    assert '] BuildFacelights: 0...1...2...3 (4)' in log
+
+
+def test_missing_compiler(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    code, phases = run_with_timeout([], str(tmp_path / 'vrad_original'))
+    assert code != 0
+    assert phases == []